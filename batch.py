@@ -0,0 +1,217 @@
+import argparse
+import asyncio
+import csv
+import json
+import os
+import sys
+import time
+from datetime import datetime
+
+from content import (
+    NUM_SCENES, generate_image_and_audio_prompts, download_images, generate_audio_from_text, save_storyline,
+    stream_narration, estimate_narration_duration
+)
+from job_state import JobState
+from render_engine import DEFAULT_PRESET, OUTPUT_FORMATS, RENDER_PRESETS
+from video_generation import render_slideshow, render_slideshow_formats, render_slideshow_streaming
+
+# Default output root; each topic gets its own sub-directory
+output_root = 'batch_output'
+
+# How many topics may be inside each stage at once. Network-bound stages overlap
+# with the CPU-bound render, so topic N+1 calls the APIs while topic N encodes.
+STAGE_LIMITS = {
+    'prompts': 4,
+    'images': 2,
+    'tts': 2,
+    'render': max(1, (os.cpu_count() or 2) // 2),
+}
+
+
+def load_topics(path):
+    """
+    Read topics from a JSONL file (one {"topic": ...} object per line) or a CSV
+    file (a "topic" column, or the first column if there is no header).
+    """
+    topics = []
+    with open(path, 'r', encoding='utf-8', newline='') as f:
+        if path.endswith('.jsonl'):
+            for line in f:
+                line = line.strip()
+                if line:
+                    topics.append(json.loads(line)['topic'])
+        else:
+            rows = list(csv.reader(f))
+            if rows and 'topic' in rows[0]:
+                column = rows[0].index('topic')
+                rows = rows[1:]
+            else:
+                column = 0
+            topics.extend(row[column] for row in rows if row and row[column].strip())
+    return [topic.strip() for topic in topics]
+
+
+def topic_directory(run_id, index, topic):
+    """Return the output directory for a topic, e.g. batch_output/20240101_120000_003_a_calm_morning."""
+    slug = "".join(x if x.isalnum() else '_' for x in topic.lower()[:40]).strip('_')
+    return os.path.join(output_root, f"{run_id}_{index:03d}_{slug}")
+
+
+class StagePipeline:
+    """Runs topics through prompts -> images -> tts -> render with a concurrency limit per stage."""
+
+    def __init__(self, limits=None, num_scenes=NUM_SCENES, stream_audio=False, render_options=None, formats=None):
+        self.limits = {**STAGE_LIMITS, **(limits or {})}
+        self.num_scenes = num_scenes
+        self.stream_audio = stream_audio
+        # Keyword arguments for render_slideshow: preset, motion, transition
+        self.render_options = render_options or {}
+        # Output formats rendered together in one pass instead of the single 1280x720 video
+        self.formats = tuple(formats or ())
+        self.semaphores = {stage: asyncio.Semaphore(limit) for stage, limit in self.limits.items()}
+
+    async def run_stage(self, stage, func, *args, **kwargs):
+        """Run a blocking stage function on a worker thread once the stage has a free slot."""
+        async with self.semaphores[stage]:
+            return await asyncio.to_thread(func, *args, **kwargs)
+
+    async def process_job(self, job):
+        """
+        Produce the video for a job and return a summary of the result.
+
+        Stages already recorded in the job state are skipped, so resuming a
+        failed job only redoes the stages (or single images and audio chunks)
+        that did not complete.
+        """
+        output_dir = job.output_dir
+        os.makedirs(output_dir, exist_ok=True)
+        result = {"job_id": job.job_id, "topic": job.topic, "output_dir": output_dir, "video": None, "variants": None,
+                  "error": None}
+
+        try:
+            prompts = job.get('prompts')
+            if prompts is None:
+                image_prompts, audio_prompt = await self.run_stage(
+                    'prompts', generate_image_and_audio_prompts, job.topic, self.num_scenes
+                )
+                if not image_prompts or not audio_prompt:
+                    raise RuntimeError("No image or audio prompts were generated.")
+                prompts = {"image_prompts": image_prompts, "audio_prompt": audio_prompt}
+                job.complete('prompts', prompts)
+
+            frames = await self.run_stage(
+                'images', download_images, prompts["image_prompts"], output_dir, checkpoint=job,
+                width=1280, height=720, model='flux', seed=42
+            )
+            if not all(frames):
+                raise RuntimeError(f"{frames.count(None)} of {len(frames)} images could not be downloaded.")
+
+            narration = job.get('narration')
+            if self.stream_audio and not self.formats and job.get_file('render') is None and (
+                    narration is None or not os.path.exists(narration["path"])):
+                # Narration is piped straight into the encoder, so TTS and render overlap in one stage
+                video_path = os.path.join(output_dir, 'video.mp4')
+                await self.run_stage(
+                    'render', render_slideshow_streaming, frames,
+                    stream_narration(prompts["audio_prompt"], output_dir), video_path,
+                    estimate_narration_duration(prompts["audio_prompt"]),
+                    preset=self.render_options.get('preset', DEFAULT_PRESET),
+                    motion=self.render_options.get('motion', False),
+                    transition=self.render_options.get('transition')
+                )
+                narration = {"path": os.path.join(output_dir, "narration.mp3"), "durations": []}
+                job.complete('narration', narration)
+                job.complete('render', video_path)
+
+            if narration is None or not os.path.exists(narration["path"]):
+                narration_path, durations = await self.run_stage(
+                    'tts', generate_audio_from_text, prompts["audio_prompt"], output_dir, checkpoint=job
+                )
+                if not narration_path:
+                    raise RuntimeError("Narration could not be generated.")
+                narration = {"path": narration_path, "durations": durations}
+                job.complete('narration', narration)
+            save_storyline(job.topic, frames, narration["path"], narration["durations"], output_dir)
+
+            video_path = job.get_file('render')
+            if video_path is None:
+                video_path = os.path.join(output_dir, 'video.mp4')
+                if self.formats:
+                    variants = await self.run_stage('render', render_slideshow_formats, frames, narration["path"],
+                                                    video_path, self.formats, **self.render_options)
+                    job.complete('variants', variants)
+                    video_path = variants[self.formats[0]]
+                else:
+                    await self.run_stage('render', render_slideshow, frames, narration["path"], video_path,
+                                         **self.render_options)
+                job.complete('render', video_path)
+            result["video"] = video_path
+            result["variants"] = job.get('variants')
+            job.finish()
+        except Exception as e:
+            result["error"] = str(e)
+            job.fail(e)
+            print(f"Error processing topic '{job.topic}' (job {job.job_id}): {e}", file=sys.stderr)
+        return result
+
+    async def run(self, jobs):
+        """Process all jobs concurrently, bounded per stage, and return results in input order."""
+        return await asyncio.gather(*(self.process_job(job) for job in jobs))
+
+
+def create_jobs(topics):
+    """Create a new job, with its own output directory, for each topic."""
+    run_id = datetime.now().strftime("%Y%m%d_%H%M%S")
+    return [JobState.create(topic, topic_directory(run_id, i, topic)) for i, topic in enumerate(topics, start=1)]
+
+
+async def run_batch(jobs, limits=None, num_scenes=NUM_SCENES, stream_audio=False, render_options=None, formats=None):
+    """Run a batch of jobs through the pipeline and print a throughput summary."""
+    started = time.monotonic()
+    results = await StagePipeline(limits, num_scenes, stream_audio, render_options, formats).run(jobs)
+    elapsed = time.monotonic() - started
+
+    produced = sum(1 for result in results if result["video"])
+    print(f"Produced {produced}/{len(results)} videos in {elapsed:.1f}s "
+          f"({produced * 3600 / elapsed if elapsed else 0:.1f} videos/hour)")
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Generate videos for a batch of topics.")
+    parser.add_argument('topics_file', nargs='?', help="JSONL or CSV file with one topic per row")
+    parser.add_argument('--resume', nargs='+', metavar='JOB_ID', help="resume saved jobs at their first incomplete stage")
+    parser.add_argument('--resume-failed', action='store_true', help="resume every saved job that failed")
+    parser.add_argument('--stream-audio', action='store_true',
+                        help="pipe narration into FFmpeg as it is synthesized instead of rendering afterwards")
+    parser.add_argument('--preset', choices=RENDER_PRESETS, default=DEFAULT_PRESET,
+                        help=f"render speed/quality preset (default: {DEFAULT_PRESET})")
+    parser.add_argument('--motion', action='store_true', help="animate frames with Ken Burns pan and zoom")
+    parser.add_argument('--transition', metavar='XFADE', help="crossfade frames with an FFmpeg xfade transition, e.g. fade")
+    parser.add_argument('--formats', nargs='+', choices=OUTPUT_FORMATS,
+                        help="render these output formats together in one pass, e.g. vertical square landscape")
+    parser.add_argument('--scenes', type=int, default=NUM_SCENES, help=f"scenes per video (default: {NUM_SCENES})")
+    for stage, limit in STAGE_LIMITS.items():
+        parser.add_argument(f'--{stage}-concurrency', type=int, default=limit,
+                            help=f"topics allowed in the {stage} stage at once (default: {limit})")
+    args = parser.parse_args()
+
+    if args.resume or args.resume_failed:
+        job_ids = args.resume or JobState.list_ids(status='failed')
+        jobs = [JobState.load(job_id) for job_id in job_ids]
+    elif args.topics_file:
+        topics = load_topics(args.topics_file)
+        jobs = create_jobs(topics)
+    else:
+        parser.error("a topics file, --resume or --resume-failed is required")
+
+    if not jobs:
+        print("No jobs to run.")
+        return
+    limits = {stage: getattr(args, f'{stage}_concurrency') for stage in STAGE_LIMITS}
+    render_options = {'preset': args.preset, 'motion': args.motion, 'transition': args.transition}
+    asyncio.run(run_batch(jobs, limits, args.scenes, args.stream_audio, render_options, args.formats))
+
+
+if __name__ == "__main__":
+    main()
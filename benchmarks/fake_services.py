@@ -0,0 +1,200 @@
+import asyncio
+import io
+import json
+import random
+import shutil
+import subprocess
+import threading
+from dataclasses import dataclass, field
+
+from aiohttp import web
+from PIL import Image
+
+SERVICES = ('gemini', 'pollinations', 'elevenlabs', 'instagram', 'socialverse')
+
+
+@dataclass
+class ServiceProfile:
+    """
+    Behaviour of one fake service: added latency (mean and +/- jitter, seconds),
+    the fraction of requests that fail, and the size of returned media.
+    Failures alternate between HTTP 429 (with Retry-After: 0) and HTTP 500.
+    """
+    latency: float = 0.2
+    jitter: float = 0.05
+    error_rate: float = 0.0
+    payload_kb: int = 200
+
+
+@dataclass
+class FakeServices:
+    """
+    Local stand-ins for Gemini, Pollinations, ElevenLabs, Instagram post fetch and
+    Socialverse upload, served from one aiohttp app on a background thread.
+
+    Each service lives under its own path prefix and on its own port (see
+    base_url), so outbound.py keeps a separate limiter per fake, as it does per
+    real host. Each follows its own ServiceProfile. Request counts per service
+    are kept in `requests`.
+    """
+    profiles: dict = field(default_factory=lambda: {name: ServiceProfile() for name in SERVICES})
+    host: str = '127.0.0.1'
+    ports: dict = field(default_factory=dict)
+    requests: dict = field(default_factory=lambda: {name: 0 for name in SERVICES})
+
+    def __post_init__(self):
+        self._loop = None
+        self._runner = None
+        self._thread = None
+        self._ready = threading.Event()
+        self._images = {}
+        self._audio = None
+        self._lock = threading.Lock()
+
+    def base_url(self, service):
+        return f"http://{self.host}:{self.ports[service]}/{service}"
+
+    def start(self):
+        """Start serving on a background thread and return once the port is bound."""
+        self._thread = threading.Thread(target=self._serve, daemon=True)
+        self._thread.start()
+        self._ready.wait()
+        return self
+
+    def stop(self):
+        if self._loop:
+            asyncio.run_coroutine_threadsafe(self._runner.cleanup(), self._loop).result()
+            self._loop.call_soon_threadsafe(self._loop.stop)
+            self._thread.join()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc_info):
+        self.stop()
+
+    def _serve(self):
+        self._loop = asyncio.new_event_loop()
+        asyncio.set_event_loop(self._loop)
+        app = web.Application(client_max_size=1024 ** 3)
+        app.add_routes([
+            web.post('/gemini/generate', self._gemini),
+            web.get('/pollinations/prompt/{prompt}', self._pollinations),
+            web.post('/elevenlabs/v1/text-to-speech/{voice_id}', self._elevenlabs),
+            web.post('/elevenlabs/v1/text-to-speech/{voice_id}/stream', self._elevenlabs),
+            web.get('/instagram/p/{shortcode}/info', self._instagram_info),
+            web.get('/instagram/media/{shortcode}.jpg', self._instagram_media),
+            web.get('/socialverse/posts/generate-upload-url', self._socialverse_upload_url),
+            web.put('/socialverse/upload/{upload_id}', self._socialverse_upload),
+            web.post('/socialverse/posts', self._socialverse_post),
+        ])
+        self._runner = web.AppRunner(app)
+        self._loop.run_until_complete(self._runner.setup())
+        for service in SERVICES:
+            site = web.TCPSite(self._runner, self.host, self.ports.get(service, 0))
+            self._loop.run_until_complete(site.start())
+            self.ports[service] = site._server.sockets[0].getsockname()[1]
+        self._ready.set()
+        self._loop.run_forever()
+
+    async def _simulate(self, service):
+        """Apply the service's latency and return an error response, or None to proceed."""
+        profile = self.profiles[service]
+        with self._lock:
+            self.requests[service] += 1
+        await asyncio.sleep(max(0.0, random.uniform(profile.latency - profile.jitter, profile.latency + profile.jitter)))
+        if random.random() < profile.error_rate:
+            if random.random() < 0.5:
+                return web.Response(status=429, headers={'Retry-After': '0'}, text='rate limited')
+            return web.Response(status=500, text='upstream error')
+        return None
+
+    def _image(self, key, payload_kb):
+        """A distinct JPEG per key, roughly payload_kb in size."""
+        if key not in self._images:
+            rng = random.Random(key)
+            side = max(16, int((payload_kb * 1024 / 1.5) ** 0.5))
+            noise = Image.frombytes('RGB', (16, 16), bytes(rng.getrandbits(8) for _ in range(16 * 16 * 3)))
+            buffer = io.BytesIO()
+            noise.resize((side + side % 2, side + side % 2), Image.NEAREST).save(buffer, 'JPEG', quality=95)
+            self._images[key] = buffer.getvalue()
+        return self._images[key]
+
+    def _mp3(self, seconds=3):
+        """A short silent MP3 (needs FFmpeg); falls back to raw MPEG frame bytes without it."""
+        if self._audio is None:
+            if shutil.which('ffmpeg'):
+                self._audio = subprocess.run(
+                    ['ffmpeg', '-v', 'error', '-f', 'lavfi', '-i', 'anullsrc=r=44100:cl=mono',
+                     '-t', str(seconds), '-b:a', '128k', '-f', 'mp3', 'pipe:1'],
+                    capture_output=True, check=True
+                ).stdout
+            else:
+                self._audio = b'\xff\xfb\x90\x64' + bytes(413) * int(seconds * 38)
+        return self._audio
+
+    async def _gemini(self, request):
+        error = await self._simulate('gemini')
+        if error:
+            return error
+        body = await request.json()
+        topic = body.get('topic', 'topic')
+        scenes = body.get('scenes', 5)
+        image_prompts = [f"{topic} scene {i}" for i in range(1, scenes + 1)]
+        audio_prompt = " ".join(f"Sentence {i} about {topic}." for i in range(1, scenes * 3 + 1))
+        text = json.dumps({'image_prompts': image_prompts, 'audio_prompt': audio_prompt})
+        return web.json_response({'text': text, 'usage': {'total_token_count': len(text) // 4}})
+
+    async def _pollinations(self, request):
+        error = await self._simulate('pollinations')
+        if error:
+            return error
+        image = self._image(request.match_info['prompt'], self.profiles['pollinations'].payload_kb)
+        return web.Response(body=image, content_type='image/jpeg')
+
+    async def _elevenlabs(self, request):
+        error = await self._simulate('elevenlabs')
+        if error:
+            return error
+        await request.read()
+        return web.Response(body=self._mp3(), content_type='audio/mpeg')
+
+    async def _instagram_info(self, request):
+        error = await self._simulate('instagram')
+        if error:
+            return error
+        shortcode = request.match_info['shortcode']
+        return web.json_response({
+            'is_video': False,
+            'url': f"{self.base_url('instagram')}/media/{shortcode}.jpg",
+            'caption': f"Caption for {shortcode}",
+        })
+
+    async def _instagram_media(self, request):
+        error = await self._simulate('instagram')
+        if error:
+            return error
+        image = self._image(request.match_info['shortcode'], self.profiles['instagram'].payload_kb)
+        return web.Response(body=image, content_type='image/jpeg')
+
+    async def _socialverse_upload_url(self, request):
+        error = await self._simulate('socialverse')
+        if error:
+            return error
+        upload_id = f"{random.getrandbits(64):016x}"
+        return web.json_response({'url': f"{self.base_url('socialverse')}/upload/{upload_id}", 'hash': upload_id})
+
+    async def _socialverse_upload(self, request):
+        error = await self._simulate('socialverse')
+        if error:
+            return error
+        async for _ in request.content.iter_chunked(1024 * 1024):
+            pass
+        return web.Response()
+
+    async def _socialverse_post(self, request):
+        error = await self._simulate('socialverse')
+        if error:
+            return error
+        await request.json()
+        return web.json_response({'status': 'ok'})
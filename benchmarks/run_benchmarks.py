@@ -0,0 +1,278 @@
+"""
+Offline benchmark for the media pipeline.
+
+Runs the content.py (topic -> video), insta_scrapper.py (download -> upload) and
+video_generation.py (FFmpeg render) flows against local fake services with
+configurable latency, error rate and payload size, across a matrix of batch
+sizes and concurrency limits. Every scenario runs in a fresh Python process so
+peak RSS and module state are per scenario.
+
+    python benchmarks/run_benchmarks.py --flows content insta video \
+        --batch-sizes 1 4 8 --concurrency 1 4 --latency 0.3 --error-rate 0.05
+
+The content and video flows need FFmpeg on PATH.
+"""
+import argparse
+import asyncio
+import json
+import os
+import re
+import resource
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+from types import SimpleNamespace
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+ROOT = os.path.dirname(BENCH_DIR)
+sys.path.insert(0, ROOT)
+
+import metrics  # noqa: E402
+import outbound  # noqa: E402
+from fake_services import SERVICES, FakeServices, ServiceProfile  # noqa: E402
+from google.api_core import exceptions as google_exceptions  # noqa: E402
+
+FLOWS = ('content', 'insta', 'video')
+
+
+def percentile(values, fraction):
+    return metrics.percentile(values, fraction) if values else 0.0
+
+
+class FakeGeminiModel:
+    """Stands in for genai.GenerativeModel, sending the request to the fake Gemini service."""
+
+    def __init__(self, endpoint, session):
+        self.endpoint = endpoint
+        self.session = session
+
+    def generate_content(self, request, generation_config=None):
+        topic = re.search(r'topic is "(.*?)"', request, re.IGNORECASE)
+        scenes = re.search(r'storyline of (\d+) scenes', request)
+        response = self.session.post(self.endpoint, json={
+            'topic': topic.group(1) if topic else request[:40],
+            'scenes': int(scenes.group(1)) if scenes else 5,
+        }, timeout=30)
+        if response.status_code != 200:
+            # Raise what the Gemini SDK raises, e.g. ResourceExhausted for 429
+            raise google_exceptions.from_http_status(response.status_code, response.text)
+        body = response.json()
+        return SimpleNamespace(text=body['text'], usage_metadata=SimpleNamespace(**body['usage']))
+
+
+def configure_modules(services, workdir):
+    """Import the pipeline modules inside workdir and point their endpoints at the fake services."""
+    os.chdir(workdir)
+    os.environ.setdefault('FLIC_TOKEN', 'benchmark')
+    metrics.METRICS_FILE = os.path.join(workdir, 'metrics.jsonl')
+
+    import content
+    content.image_url = f"{services.base_url('pollinations')}/prompt"
+    content.url = f"{services.base_url('elevenlabs')}/v1/text-to-speech"
+    content.gemini_model = FakeGeminiModel(f"{services.base_url('gemini')}/generate", content.session)
+    return content
+
+
+def run_content(services, workdir, batch_size, concurrency):
+    """Topics through prompts -> images -> TTS -> render with batch.StagePipeline."""
+    configure_modules(services, workdir)
+    import batch
+
+    topics = [f"benchmark topic {i}" for i in range(1, batch_size + 1)]
+    jobs = batch.create_jobs(topics)
+    pipeline = batch.StagePipeline({stage: concurrency for stage in batch.STAGE_LIMITS})
+    latencies = []
+
+    async def timed(job):
+        started = time.perf_counter()
+        result = await pipeline.process_job(job)
+        latencies.append(time.perf_counter() - started)
+        return result
+
+    async def run():
+        return await asyncio.gather(*(timed(job) for job in jobs))
+
+    results = asyncio.run(run())
+    return latencies, sum(1 for result in results if result['error'])
+
+
+def run_insta(services, workdir, batch_size, concurrency):
+    """Instagram posts through download -> dedup check -> Socialverse upload with process_media_url."""
+    configure_modules(services, workdir)
+    import insta_scrapper
+    from dedup_index import DedupIndex
+
+    class FakeInstagramDownloader(insta_scrapper.InstagramDownloader):
+        async def fetch_post(self, shortcode):
+            info_url = f"{services.base_url('instagram')}/p/{shortcode}/info"
+            async with outbound.arequest(self._get_session(), 'GET', info_url, retries=self.max_retries) as response:
+                if response.status != 200:
+                    raise Exception(f"Instagram error {response.status}")
+                return SimpleNamespace(**await response.json())
+
+    insta_scrapper.SOCIALVERSE_API = services.base_url('socialverse')
+    insta_scrapper.dedup = DedupIndex(os.path.join(workdir, 'dedup.sqlite3'))
+    urls = [f"https://www.instagram.com/p/BENCH{i:05d}/" for i in range(1, batch_size + 1)]
+    latencies = []
+
+    async def timed(url):
+        started = time.perf_counter()
+        try:
+            await insta_scrapper.process_media_url(url)
+            return None
+        except Exception as e:
+            return e
+        finally:
+            latencies.append(time.perf_counter() - started)
+
+    async def run():
+        insta_scrapper.downloader = FakeInstagramDownloader(concurrency=concurrency)
+        insta_scrapper.socialverse = insta_scrapper.SocialverseClient(upload_concurrency=concurrency)
+        try:
+            return await asyncio.gather(*(timed(url) for url in urls))
+        finally:
+            await insta_scrapper.downloader.close()
+            await insta_scrapper.socialverse.close()
+
+    results = asyncio.run(run())
+    return latencies, sum(1 for result in results if result is not None)
+
+
+def run_video(services, workdir, batch_size, concurrency):
+    """One slideshow render of batch_size frames, then batch_size per-image encodes in parallel."""
+    content = configure_modules(services, workdir)
+    import insta_scrapper
+    from video_generation import render_slideshow
+
+    frames_dir = os.path.join(workdir, 'frames')
+    os.makedirs(frames_dir, exist_ok=True)
+    frames = []
+    for i in range(1, batch_size + 1):
+        path = os.path.join(frames_dir, f"{i:03d}.jpg")
+        response = content.session.get(f"{services.base_url('pollinations')}/prompt/frame{i}", timeout=30)
+        with open(path, 'wb') as f:
+            f.write(response.content)
+        frames.append(path)
+    audio_path = os.path.join(workdir, 'audio.mp3')
+    response = content.session.post(f"{services.base_url('elevenlabs')}/v1/text-to-speech/voice", json={}, timeout=30)
+    with open(audio_path, 'wb') as f:
+        f.write(response.content)
+
+    latencies = []
+    errors = 0
+    started = time.perf_counter()
+    try:
+        render_slideshow(frames, audio_path, os.path.join(workdir, 'slideshow.mp4'))
+    except Exception:
+        errors += 1
+    latencies.append(time.perf_counter() - started)
+
+    summary = insta_scrapper.create_videos_with_audio(frames_dir, audio_path, os.path.join(workdir, 'videos'),
+                                                      workers=concurrency)
+    with open(metrics.METRICS_FILE, 'r', encoding='utf-8') as f:
+        latencies.extend(entry['wall_time'] for entry in map(json.loads, f) if entry['stage'] == 'ffmpeg_job')
+    return latencies, errors + len(summary['failed'])
+
+
+RUNNERS = {'content': run_content, 'insta': run_insta, 'video': run_video}
+
+
+def run_scenario(args):
+    """Run one scenario in this process and print its result as JSON."""
+    profiles = {
+        name: ServiceProfile(latency=args.latency, jitter=args.jitter, error_rate=args.error_rate,
+                             payload_kb=args.payload_kb)
+        for name in SERVICES
+    }
+    workdir = tempfile.mkdtemp(prefix=f"bench_{args.flow}_")
+    try:
+        with FakeServices(profiles) as services:
+            started = time.perf_counter()
+            latencies, errors = RUNNERS[args.flow](services, workdir, args.batch_size, args.concurrency)
+            elapsed = time.perf_counter() - started
+            requests = dict(services.requests)
+
+        stages = metrics.summarize() if os.path.exists(metrics.METRICS_FILE) else {}
+    finally:
+        os.chdir(ROOT)
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    items = args.batch_size
+    print(json.dumps({
+        'flow': args.flow,
+        'batch_size': items,
+        'concurrency': args.concurrency,
+        'wall_time': round(elapsed, 3),
+        'throughput': round((items - errors) / elapsed, 3) if elapsed else 0.0,
+        'p50': round(percentile(latencies, 0.50), 3),
+        'p95': round(percentile(latencies, 0.95), 3),
+        'errors': errors,
+        # ru_maxrss is reported in kilobytes on Linux
+        'peak_rss_mb': round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1),
+        'peak_child_rss_mb': round(resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss / 1024, 1),
+        'requests': requests,
+        'stages': stages,
+    }))
+
+
+def print_table(results):
+    print(f"{'flow':<9}{'batch':>6}{'conc':>6}{'wall s':>9}{'items/s':>9}{'p50 s':>8}{'p95 s':>8}"
+          f"{'errors':>8}{'RSS MB':>8}{'child MB':>10}")
+    for r in results:
+        print(f"{r['flow']:<9}{r['batch_size']:>6}{r['concurrency']:>6}{r['wall_time']:>9.2f}{r['throughput']:>9.2f}"
+              f"{r['p50']:>8.2f}{r['p95']:>8.2f}{r['errors']:>8}{r['peak_rss_mb']:>8.1f}{r['peak_child_rss_mb']:>10.1f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the media pipeline against local fake services.")
+    parser.add_argument('--flows', nargs='+', choices=FLOWS, default=list(FLOWS))
+    parser.add_argument('--batch-sizes', nargs='+', type=int, default=[1, 4, 8])
+    parser.add_argument('--concurrency', nargs='+', type=int, default=[1, 4])
+    parser.add_argument('--latency', type=float, default=0.2, help="mean fake service latency in seconds")
+    parser.add_argument('--jitter', type=float, default=0.05, help="+/- latency jitter in seconds")
+    parser.add_argument('--error-rate', type=float, default=0.0, help="fraction of fake requests that fail")
+    parser.add_argument('--payload-kb', type=int, default=200, help="approximate size of fake images")
+    parser.add_argument('--json', metavar='PATH', help="also write all results, with per-stage metrics, to PATH")
+    # Internal: run a single scenario and print its JSON result
+    parser.add_argument('--scenario', nargs=3, metavar=('FLOW', 'BATCH', 'CONCURRENCY'), help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.scenario:
+        args.flow, args.batch_size, args.concurrency = args.scenario[0], int(args.scenario[1]), int(args.scenario[2])
+        run_scenario(args)
+        return
+
+    flows = args.flows
+    if not shutil.which('ffmpeg'):
+        skipped = [flow for flow in flows if flow != 'insta']
+        if skipped:
+            print(f"FFmpeg not found, skipping flows: {', '.join(skipped)}", file=sys.stderr)
+        flows = [flow for flow in flows if flow == 'insta']
+
+    service_args = ['--latency', str(args.latency), '--jitter', str(args.jitter),
+                    '--error-rate', str(args.error_rate), '--payload-kb', str(args.payload_kb)]
+    results = []
+    for flow in flows:
+        for batch_size in args.batch_sizes:
+            for concurrency in args.concurrency:
+                command = [sys.executable, os.path.abspath(__file__), '--scenario', flow, str(batch_size),
+                           str(concurrency), *service_args]
+                completed = subprocess.run(command, capture_output=True, text=True, cwd=ROOT)
+                if completed.returncode != 0:
+                    print(f"Scenario {flow} batch={batch_size} concurrency={concurrency} failed:\n{completed.stderr}",
+                          file=sys.stderr)
+                    continue
+                results.append(json.loads(completed.stdout.strip().splitlines()[-1]))
+                print(f"Finished {flow} batch={batch_size} concurrency={concurrency} "
+                      f"in {results[-1]['wall_time']:.1f}s", file=sys.stderr)
+    print_table(results)
+
+    if args.json:
+        with open(args.json, 'w', encoding='utf-8') as f:
+            json.dump(results, f, indent=4)
+
+
+if __name__ == "__main__":
+    main()
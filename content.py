@@ -1,11 +1,28 @@
 import re
 import os
+import ast
+import json
+import shutil
+import threading
 import requests
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
+from requests.adapters import HTTPAdapter
+import outbound
+from ffmpeg_utils import probe_duration
+from job_state import JobState
+from metrics import current_span, trace, traced
+from media_cache import cache_key, get_cache
 import google.generativeai as genai  # Gemini import
 
 # Configure the Gemini API key
 genai.configure(api_key="gemini_api")
+GEMINI_MODEL = "gemini-1.5-flash"
+gemini_model = genai.GenerativeModel(GEMINI_MODEL)
+
+# Scenes per storyline, and how many times an unparseable response is sent back for correction
+NUM_SCENES = 5
+MAX_REPROMPTS = 1
 
 # Replace with your Eleven Labs API key
 API_KEY = ""  # Enter your Eleven Labs API key here
@@ -16,121 +33,479 @@ url = "https://api.elevenlabs.io/v1/text-to-speech"
 # Default voice ID for free-tier users
 default_voice_id = "IKne3meq5aSn9XLyUdCD"  # Example voice ID; may vary
 
+# Voice settings sent with every synthesis request
+voice_settings = {
+    "stability": 0.5,
+    "similarity_boost": 0.75
+}
+
+# Maximum concurrent Eleven Labs requests (free tier allows 2); shared by all callers
+TTS_CONCURRENCY = 2
+tts_semaphore = threading.BoundedSemaphore(TTS_CONCURRENCY)
+
+# Streaming narration: bytes read per piece, and the speaking rate used to time frames in advance
+STREAM_CHUNK_SIZE = 16 * 1024
+WORDS_PER_SECOND = 2.5
+
+# Endpoint for Pollinations AI image generation
+image_url = "https://image.pollinations.ai/prompt"
+
+# Image fetch settings: parallel downloads, per-request timeout (seconds) and retries
+IMAGE_CONCURRENCY = 4
+REQUEST_TIMEOUT = 120
+MAX_RETRIES = 3
+
+# One pooled HTTP session shared by every outbound request
+session = requests.Session()
+session.mount("https://", HTTPAdapter(pool_connections=4, pool_maxsize=IMAGE_CONCURRENCY * 2))
+
+# On-disk cache for Gemini responses, rendered images and TTS audio
+cache = get_cache()
+
 # Create the local_media directory if it doesn't exist
 os.makedirs('local_media', exist_ok=True)
 
-def generate_image_and_audio_prompts(prompt):
+def decode_object(text, key):
+    """Return the first JSON object with the given key embedded in text, decoding from each '{' in turn, or None."""
+    decoder = json.JSONDecoder()
+    for match in re.finditer(r'\{', text):
+        try:
+            value, _ = decoder.raw_decode(text, match.start())
+        except (ValueError, RecursionError):
+            continue
+        if isinstance(value, dict) and key in value:
+            return value
+    return None
+
+def strip_trailing_commas(text):
+    """Drop commas directly before a closing ] or }, leaving the contents of JSON strings alone."""
+    out = []
+    in_string = escaped = False
+    for char in text:
+        if in_string:
+            if escaped:
+                escaped = False
+            elif char == '\\':
+                escaped = True
+            elif char == '"':
+                in_string = False
+        elif char == '"':
+            in_string = True
+        elif char in ']}':
+            end = len(out)
+            while end and out[end - 1].isspace():
+                end -= 1
+            if end and out[end - 1] == ',':
+                del out[end - 1]
+        out.append(char)
+    return ''.join(out)
+
+def brace_spans(text):
+    """
+    Return (start, end) of every balanced {...} span in text, in order of start, so an
+    outer span comes before the ones nested in it.
+    Quotes (single or double) only open strings inside braces, so apostrophes in prose are ignored.
+    """
+    spans, stack = [], []
+    quote = None
+    escaped = False
+    for i, char in enumerate(text):
+        if quote:
+            if escaped:
+                escaped = False
+            elif char == '\\':
+                escaped = True
+            elif char == quote:
+                quote = None
+        elif char in '"\'' and stack:
+            quote = char
+        elif char == '{':
+            stack.append(i)
+        elif char == '}' and stack:
+            spans.append((stack.pop(), i + 1))
+    return sorted(spans)
+
+def eval_object(text, key):
+    """Return the first Python-style dict literal ({'key': ...}) with the given key in text, or None."""
+    for start, end in brace_spans(text):
+        try:
+            value = ast.literal_eval(text[start:end])
+        except (ValueError, TypeError, SyntaxError, MemoryError, RecursionError):
+            continue
+        if isinstance(value, dict) and key in value:
+            return value
+    return None
+
+def parse_storyline(text, num_scenes=NUM_SCENES):
+    """Parse and validate a Gemini storyline response.
+
+    Accepts strict JSON and repairs common near-JSON output locally: code
+    fences, surrounding prose, trailing commas, Python-style quoting and the
+    older `image_prompts = [...]` / `audio_prompt = "..."` format. Returns
+    (image_prompts, audio_prompt) or raises ValueError describing what is wrong.
+    """
+    cleaned = re.sub(r'^```(?:json|python)?\s*|\s*```$', '', text.strip(), flags=re.MULTILINE)
+    # Braces in the surrounding prose are skipped: only an object carrying the schema's key is taken
+    data = decode_object(cleaned, "image_prompts")
+    if data is None:
+        data = decode_object(strip_trailing_commas(cleaned), "image_prompts")
+    if data is None:
+        data = eval_object(cleaned, "image_prompts")
+
+    if data is None:
+        # Older free-text format: image_prompts = [...] and audio_prompt = "..."
+        image_prompts_match = re.search(r'image_prompts\s*=\s*(\[.*?\])', cleaned, re.DOTALL)
+        audio_prompt_match = re.search(r'audio_prompt\s*=\s*("(?:[^"\\]|\\.)*")', cleaned, re.DOTALL)
+        if not image_prompts_match or not audio_prompt_match:
+            raise ValueError("Response is not valid JSON and has no image_prompts/audio_prompt.")
+        try:
+            data = {
+                "image_prompts": ast.literal_eval(image_prompts_match.group(1)),
+                "audio_prompt": ast.literal_eval(audio_prompt_match.group(1)),
+            }
+        except (ValueError, TypeError, SyntaxError) as e:
+            raise ValueError(f"Could not parse image_prompts/audio_prompt: {e}")
+
+    # Validate against the schema: N non-empty image prompts and one narration string
+    if not isinstance(data, dict):
+        raise ValueError("Response must be a JSON object.")
+    image_prompts = data.get("image_prompts")
+    audio_prompt = data.get("audio_prompt")
+    if not isinstance(image_prompts, list) or not all(isinstance(p, str) and p.strip() for p in image_prompts):
+        raise ValueError("image_prompts must be a list of non-empty strings.")
+    if len(image_prompts) < num_scenes:
+        raise ValueError(f"Expected {num_scenes} image_prompts, got {len(image_prompts)}.")
+    if not isinstance(audio_prompt, str) or not audio_prompt.strip():
+        raise ValueError("audio_prompt must be a non-empty string.")
+    return [p.strip() for p in image_prompts[:num_scenes]], audio_prompt.strip()
+
+def request_storyline(request):
+    """Send one structured request to Gemini and return the response text."""
+    span = current_span()
+    response = outbound.call(
+        outbound.GEMINI_HOST, gemini_model.generate_content, request,
+        generation_config={"response_mime_type": "application/json"},
+        throttle_on=outbound.GEMINI_THROTTLE_ERRORS,
+        retry_on=outbound.GEMINI_RETRY_ERRORS
+    )
+    span.add_units('characters', len(request) + len(response.text))
+    usage = getattr(response, 'usage_metadata', None)
+    if usage is not None:
+        span.add_units('tokens', usage.total_token_count)
+    return response.text
+
+@traced('gemini_prompts')
+def generate_image_and_audio_prompts(prompt, num_scenes=NUM_SCENES):
     """Generate image and audio prompts using the Gemini model."""
     try:
-        # Request to the Gemini API
-        response = genai.GenerativeModel("gemini-1.5-flash").generate_content(
-            f"""will tell you : create 5 prompts for the image according the topic i give you and it should be in a storyline
-            next create 5 prompts for the audio voice over for each image which is one liner with emotions the topic is "{prompt}" which motivates , cheers me up or calms me. The storyline should be realistic and user relatable. Store it in a python list format ["1,2,3"]. The audio prompt should be one long text for all combined related images, no need to mention the image no. in front of audio prompt. Just a simple long text combined for all the audio prompts. The text should not include anything in brackets or pauses, just a smooth narration that fits with the images you generated."""
+        request = (
+            f"""Create a storyline of {num_scenes} scenes. The topic is "{prompt}"; the story should motivate, cheer me up or calm me, and be realistic and user relatable.
+            For each scene write one prompt for an image generator. Then write the voice-over as one long, smooth narration covering all scenes together, without scene numbers, anything in brackets or pauses.
+            Respond with only a JSON object of the form {{"image_prompts": ["scene 1", ...], "audio_prompt": "narration"}} with exactly {num_scenes} image_prompts."""
         )
 
-        # Debug: Print the raw response
-        print("Raw API Response:", response.text)
-
-        # Adjusting the regex to handle the string format better
-        image_prompts_match = re.search(r'image_prompts\s*=\s*\[(.*?)\]', response.text, re.DOTALL)
-        audio_prompt_match = re.search(r'audio_prompt\s*=\s*"(.*?)"', response.text, re.DOTALL)
+        # Reuse the stored response when this exact request has been answered before
+        key = cache_key('gemini', GEMINI_MODEL, request)
+        response_text = cache.get_text(key)
+        span = current_span()
+        span.set(cache_hit=response_text is not None)
+        if response_text is None:
+            # Request to the Gemini API
+            response_text = request_storyline(request)
 
-        if image_prompts_match and audio_prompt_match:
-            # Extract image prompts
-            image_prompts_str = image_prompts_match.group(1).strip()
-            image_prompts = eval(f"[{image_prompts_str}]")
+        # Debug: Print the raw response
+        print("Raw API Response:", response_text)
 
-            # Extract audio prompt
-            audio_prompt = audio_prompt_match.group(1).strip()
+        for attempt in range(MAX_REPROMPTS + 1):
+            try:
+                image_prompts, audio_prompt = parse_storyline(response_text, num_scenes)
+                break
+            except ValueError as e:
+                if attempt == MAX_REPROMPTS:
+                    raise
+                # Local repair failed: ask once more, quoting what was wrong with the last answer
+                print(f"Invalid storyline response ({e}), asking Gemini to correct it")
+                span.add_retry()
+                response_text = request_storyline(
+                    f"{request}\n\nYour previous answer was invalid: {e}\nPrevious answer:\n{response_text}\n"
+                    "Return only the corrected JSON object."
+                )
 
-            return image_prompts, audio_prompt
-        else:
-            raise ValueError("Image prompts or audio prompts not found in the response.")
+        # Only responses that parsed are cached, so a bad answer is never replayed
+        cache.put_text(key, response_text)
+        return image_prompts, audio_prompt
 
     except Exception as e:
         print("Error in generate_image_and_audio_prompts:", e)
         return [], ""
 
-def download_and_save_image(prompt, filename, width=1280, height=720, model='flux', seed=None):
-    """Download and save an image from Pollinations AI."""
+@traced('pollinations_image')
+def download_and_save_image(prompt, filename, width=1280, height=720, model='flux', seed=None,
+                            timeout=REQUEST_TIMEOUT, retries=MAX_RETRIES):
+    """Download and save an image from Pollinations AI, retrying through the outbound limiter on failure."""
+    # Renders are only deterministic (and therefore cacheable) with a fixed seed
+    key = cache_key('image', prompt, model, width, height, seed) if seed is not None else None
+    span = current_span()
+    if key and cache.copy_to(key, filename, '.png'):
+        span.set(cache_hit=True)
+        print(f"Image loaded from cache and saved as {filename}")
+        return filename
+
+    url = f"{image_url}/{requests.utils.quote(prompt, safe='')}"
+    params = {"width": width, "height": height, "model": model, "seed": seed}
     try:
-        url = f"https://image.pollinations.ai/prompt/{prompt}?width={width}&height={height}&model={model}&seed={seed}"
-        response = requests.get(url)
-        if response.status_code == 200:
-            with open(filename, 'wb') as file:
-                file.write(response.content)
-            print(f"Image downloaded and saved as {filename}")
-            return filename
-        else:
-            print(f"Failed to download image for prompt: {prompt} (Status Code: {response.status_code})")
-    except Exception as e:
+        response = outbound.request(session, 'GET', url, retries=retries, params=params, timeout=timeout)
+    except (requests.RequestException, outbound.CircuitOpenError) as e:
         print(f"Error downloading image for prompt '{prompt}': {e}")
         return None
+    span.add_bytes(len(response.content))
+    if response.status_code != 200:
+        print(f"Failed to download image for prompt: {prompt} (Status Code: {response.status_code})")
+        return None
+    with open(filename, 'wb') as file:
+        file.write(response.content)
+    if key:
+        cache.put(key, response.content, '.png')
+    print(f"Image downloaded and saved as {filename}")
+    return filename
+
+def download_images(image_prompts, output_dir='local_media', concurrency=IMAGE_CONCURRENCY, checkpoint=None, **kwargs):
+    """Download images for all prompts in parallel and return their paths in storyline order.
+
+    With a checkpoint (a JobState), images recorded by an earlier attempt are
+    reused and each new image is recorded as soon as it is saved.
+    """
+    # Filenames share one timestamp and carry the prompt index, so sorting them keeps the storyline order
+    timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+    filenames = []
+    for i, prompt in enumerate(image_prompts, start=1):
+        clean_prompt = "".join(x for x in prompt[:30] if x.isalnum() or x in (' ', '-', '_')).strip()
+        filenames.append(os.path.join(output_dir, f"{timestamp}_{i:02d}_{clean_prompt}.png"))
+
+    def fetch(i, prompt, filename):
+        stage = f"image_{i}"
+        if checkpoint and checkpoint.get_file(stage):
+            return checkpoint.get_file(stage)
+        filename = download_and_save_image(prompt, filename, **kwargs)
+        if checkpoint and filename:
+            checkpoint.complete(stage, filename)
+        return filename
+
+    os.makedirs(output_dir, exist_ok=True)
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        # executor.map yields results in submission order regardless of completion order
+        return list(executor.map(fetch, range(1, len(image_prompts) + 1), image_prompts, filenames))
+
+def split_text(text, max_length=600):
+    """Split text into chunks of at most max_length characters on sentence boundaries."""
+    sentences = re.split(r'(?<=[.!?])\s+', text.strip())
+    chunks, current = [], ""
+    for sentence in sentences:
+        # A sentence longer than max_length is broken on word boundaries instead
+        while len(sentence) > max_length:
+            cut = sentence.rfind(' ', 0, max_length)
+            if cut <= 0:
+                cut = max_length
+            if current:
+                chunks.append(current)
+                current = ""
+            chunks.append(sentence[:cut].strip())
+            sentence = sentence[cut:].strip()
+
+        if current and len(current) + 1 + len(sentence) > max_length:
+            chunks.append(current)
+            current = sentence
+        else:
+            current = f"{current} {sentence}".strip()
+    if current:
+        chunks.append(current)
+    return chunks
+
+def tts_request(text_chunk):
+    """Headers and payload for an Eleven Labs synthesis request."""
+    headers = {
+        "Content-Type": "application/json",
+        "xi-api-key": API_KEY,
+    }
+    payload = {
+        "text": text_chunk,
+        "voice_settings": voice_settings
+    }
+    return headers, payload
+
+@traced('elevenlabs_chunk')
+def synthesize_chunk(text_chunk, filename, retries=MAX_RETRIES):
+    """Synthesize one chunk of narration with Eleven Labs and save it to filename."""
+    headers, payload = tts_request(text_chunk)
+
+    key = cache_key('tts', text_chunk, default_voice_id, voice_settings)
+    span = current_span()
+    if cache.copy_to(key, filename, '.mp3'):
+        span.set(cache_hit=True)
+        print(f"Audio loaded from cache and saved as {filename}")
+        return filename
+
+    # The semaphore caps in-flight requests at the account's concurrency limit; the limiter paces and retries them
+    with tts_semaphore:
+        response = outbound.request(session, 'POST', f"{url}/{default_voice_id}", retries=retries,
+                                    headers=headers, json=payload, timeout=REQUEST_TIMEOUT)
+    span.add_units('characters', len(text_chunk))
+    span.add_bytes(len(response.content))
+
+    if response.status_code != 200:
+        print(f"Error for {filename}: {response.status_code}, {response.text}")
+        return None
+    with open(filename, "wb") as file:
+        file.write(response.content)
+    cache.put(key, response.content, '.mp3')
+    print(f"Audio file saved as {filename}")
+    return filename
+
+def stream_tts_chunk(text_chunk, retries=MAX_RETRIES):
+    """Yield the audio of one narration chunk piece by piece as Eleven Labs streams it."""
+    headers, payload = tts_request(text_chunk)
+    span = current_span()
+    # The semaphore is held for the whole stream, since generation is still running on the API side
+    with tts_semaphore:
+        response = outbound.request(session, 'POST', f"{url}/{default_voice_id}/stream", retries=retries,
+                                    headers=headers, json=payload, timeout=REQUEST_TIMEOUT, stream=True)
+        with response:
+            if response.status_code != 200:
+                print(f"Error streaming narration chunk: {response.status_code}")
+                raise RuntimeError(f"Narration stream failed with status {response.status_code}")
+            span.add_units('characters', len(text_chunk))
+            for piece in response.iter_content(STREAM_CHUNK_SIZE):
+                span.add_bytes(len(piece))
+                yield piece
+
+def stream_narration(text, output_dir='local_media'):
+    """Yield the narration for text as MP3 bytes while it is being synthesized.
+
+    Chunks are streamed in order, so a consumer such as FFmpeg can start before
+    the whole narration exists and no chunk is ever held in memory in full.
+    The audio is also written to output_dir (each chunk plus narration.mp3), and
+    finished chunks go into the media cache. Cached chunks are read from disk.
+    """
+    os.makedirs(output_dir, exist_ok=True)
+    with trace('elevenlabs_stream'), open(os.path.join(output_dir, "narration.mp3"), "wb") as narration:
+        for i, text_chunk in enumerate(split_text(text), start=1):
+            key = cache_key('tts', text_chunk, default_voice_id, voice_settings)
+            chunk_path = os.path.join(output_dir, f"output_audio_{i}.mp3")
+            cached = cache.get(key, '.mp3')
+            source = open(cached, "rb") if cached else None
+            pieces = iter(lambda: source.read(STREAM_CHUNK_SIZE), b'') if source else stream_tts_chunk(text_chunk)
+
+            with open(chunk_path, "wb") as chunk_file:
+                for piece in pieces:
+                    chunk_file.write(piece)
+                    narration.write(piece)
+                    yield piece
+            if source:
+                source.close()
+            else:
+                cache.put_file(key, chunk_path, '.mp3')
+
+def estimate_narration_duration(text):
+    """Rough narration length in seconds, for timing frames before the audio exists."""
+    return max(1.0, len(text.split()) / WORDS_PER_SECOND)
+
+@traced('elevenlabs_narration')
+def generate_audio_from_text(text, output_dir='local_media', checkpoint=None):
+    """Generate a single narration track from text using Eleven Labs API.
+
+    Chunks are synthesized concurrently and merged in order into narration.mp3.
+    Returns the narration path and the duration of each chunk in seconds,
+    or (None, []) if any chunk failed. With a checkpoint (a JobState), chunks
+    recorded by an earlier attempt are not synthesized again.
+    """
+    def synthesize(i, text_chunk):
+        stage = f"audio_chunk_{i}"
+        if checkpoint and checkpoint.get_file(stage):
+            return checkpoint.get_file(stage)
+        filename = synthesize_chunk(text_chunk, os.path.join(output_dir, f"output_audio_{i}.mp3"))
+        if checkpoint and filename:
+            checkpoint.complete(stage, filename)
+        return filename
 
-def generate_audio_from_text(text):
-    """Generate audio from text using Eleven Labs API."""
     try:
-        # Function to split text into smaller chunks for Eleven Labs API
-        def split_text(text, max_length=600):
-            return [text[i:i + max_length] for i in range(0, len(text), max_length)]
-        
-        # Split the long audio text into smaller chunks
+        # Split the long audio text into sentence-aligned chunks
         chunks = split_text(text)
+        os.makedirs(output_dir, exist_ok=True)
+        narration_path = os.path.join(output_dir, "narration.mp3")
 
-        # Headers for API request
-        headers = {
-            "Content-Type": "application/json",
-            "xi-api-key": API_KEY,
-        }
-
-        # Process each chunk and create audio files
-        for i, text_chunk in enumerate(chunks, start=1):
-            payload = {
-                "text": text_chunk,
-                "voice_settings": {
-                    "stability": 0.5,
-                    "similarity_boost": 0.75
-                }
-            }
-            
-            # Send the POST request to Eleven Labs
-            response = requests.post(f"{url}/{default_voice_id}", headers=headers, json=payload)
-            
-            if response.status_code == 200:
-                # Save the audio to a file with a unique name for each chunk
-                filename = f"local_media/output_audio_{i}.mp3"
-                with open(filename, "wb") as file:
-                    file.write(response.content)
-                print(f"Audio file saved as {filename}")
-            else:
-                print(f"Error for chunk {i}: {response.status_code}, {response.text}")
+        with ThreadPoolExecutor(max_workers=max(1, len(chunks))) as executor:
+            futures = [
+                executor.submit(synthesize, i, text_chunk)
+                for i, text_chunk in enumerate(chunks, start=1)
+            ]
+
+            # Merge chunks in order as soon as each one (and every chunk before it) is ready
+            durations = []
+            with open(narration_path, "wb") as narration:
+                for future in futures:
+                    filename = future.result()
+                    if filename is None:
+                        raise RuntimeError("Narration is incomplete: a chunk failed to synthesize")
+                    with open(filename, "rb") as chunk_file:
+                        shutil.copyfileobj(chunk_file, narration)
+                    durations.append(probe_duration(filename))
+
+        print(f"Narration saved as {narration_path} ({sum(durations):.1f}s)")
+        return narration_path, durations
 
     except Exception as e:
         print(f"Error generating audio: {e}")
+        return None, []
+
+def save_storyline(topic, frames, narration_path, durations, output_dir='local_media'):
+    """Write the storyline manifest that video_generation.py renders from."""
+    manifest_path = os.path.join(output_dir, "storyline.json")
+    storyline = {
+        "topic": topic,
+        "frames": frames,
+        "narration": narration_path,
+        "durations": durations
+    }
+    with open(manifest_path, 'w', encoding='utf-8') as f:
+        json.dump(storyline, f, indent=4)
+    print(f"Storyline manifest saved as {manifest_path}")
+    return manifest_path
 
 # Main execution flow
 if __name__ == "__main__":
     # Step 1: Get user input and generate image and audio prompts
     prompt_input = input("Enter a topic to generate prompts: ")
-    image_prompts, audio_prompt = generate_image_and_audio_prompts(prompt_input)
-
-    if image_prompts and audio_prompt:
-        print(f"Generated Image Prompts: {image_prompts}")
-        print(f"Generated Audio Prompt: {audio_prompt}")
+    # Every step is checkpointed, so a failed run can be resumed with batch.py --resume
+    job = JobState.create(prompt_input, 'local_media', job_id=datetime.now().strftime("%Y%m%d_%H%M%S"))
+    try:
+        image_prompts, audio_prompt = generate_image_and_audio_prompts(prompt_input)
 
-        # Step 2: Use the generated image prompts to download and save images
-        for i, prompt in enumerate(image_prompts):
-            print(f"Processing prompt {i+1}: {prompt}")
+        if image_prompts and audio_prompt:
+            job.complete('prompts', {"image_prompts": image_prompts, "audio_prompt": audio_prompt})
+            print(f"Generated Image Prompts: {image_prompts}")
+            print(f"Generated Audio Prompt: {audio_prompt}")
 
-            # Create a filename using timestamp and prompt
-            timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-            clean_prompt = "".join(x for x in prompt[:30] if x.isalnum() or x in (' ', '-', '_')).strip()
-            new_filename = f"local_media/{timestamp}_{clean_prompt}.png"
+            # Step 2: Use the generated image prompts to download and save images concurrently
+            frames = download_images(image_prompts, 'local_media', checkpoint=job,
+                                     width=1280, height=720, model='flux', seed=42)
 
-            download_and_save_image(prompt, new_filename, width=1280, height=720, model='flux', seed=42)
+            # Step 3: Generate the narration track from the combined audio prompt
+            narration_path, durations = generate_audio_from_text(audio_prompt, checkpoint=job)
 
-        # Step 3: Generate the audio from the combined audio prompt
-        generate_audio_from_text(audio_prompt)
+            # Step 4: Record the ordered frames and narration for video_generation.py
+            if all(frames) and narration_path:
+                job.complete('narration', {"path": narration_path, "durations": durations})
+                save_storyline(prompt_input, frames, narration_path, durations)
+                job.finish()
+            else:
+                job.fail("Some images or narration chunks could not be generated.")
+                print(f"Run incomplete. Resume it with: python batch.py --resume {job.job_id}")
 
-    else:
-        print("No image or audio prompts were generated.")
+        else:
+            job.fail("No image or audio prompts were generated.")
+            print("No image or audio prompts were generated.")
+    except BaseException as e:
+        # Crashed or interrupted runs are marked failed too, so batch.py --resume-failed picks them up
+        job.fail(repr(e))
+        print(f"Run stopped. Resume it with: python batch.py --resume {job.job_id}")
+        raise
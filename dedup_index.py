@@ -0,0 +1,150 @@
+import hashlib
+import sqlite3
+import threading
+from datetime import datetime
+
+from PIL import Image
+
+# Default index location and the largest perceptual-hash distance treated as a duplicate
+DEDUP_DB = 'dedup_index.sqlite3'
+PHASH_DISTANCE = 6
+
+IMAGE_EXTENSIONS = ('.jpg', '.jpeg', '.png', '.webp')
+
+
+def content_hash(path):
+    """Return the sha256 of a file's contents."""
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(1024 * 1024), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def perceptual_hash(path):
+    """
+    Return a 64-bit difference hash (dHash) of an image as a hex string, or None
+    for files that are not images. Re-encoded, resized or lightly edited copies
+    of an image hash to values a few bits apart.
+    """
+    if not path.lower().endswith(IMAGE_EXTENSIONS):
+        return None
+    with Image.open(path) as image:
+        pixels = list(image.convert('L').resize((9, 8), Image.LANCZOS).getdata())
+    bits = 0
+    for row in range(8):
+        for col in range(8):
+            left, right = pixels[row * 9 + col], pixels[row * 9 + col + 1]
+            bits = (bits << 1) | (left > right)
+    return f"{bits:016x}"
+
+
+def hamming_distance(a, b):
+    """Number of differing bits between two hex-encoded hashes."""
+    return bin(int(a, 16) ^ int(b, 16)).count('1')
+
+
+class DedupIndex:
+    """
+    Persistent SQLite index of processed posts.
+
+    Each record is keyed by (shortcode, action), where action is the step that
+    completed, e.g. 'downloaded' or 'uploaded'. The content hash and perceptual
+    hash of the media are stored alongside, so the same or a near-identical
+    image posted under a different shortcode is caught too. Concurrent jobs
+    reserve their media with find_or_reserve, so two copies of one image in
+    the same run are not both processed.
+    """
+
+    def __init__(self, path=DEDUP_DB, max_distance=PHASH_DISTANCE):
+        self.max_distance = max_distance
+        self._lock = threading.Lock()
+        # Media reserved by jobs still in progress, per action: {shortcode: (content_hash, phash)}
+        self._pending = {}
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        with self._conn:
+            self._conn.execute(
+                """CREATE TABLE IF NOT EXISTS processed (
+                    shortcode TEXT NOT NULL,
+                    action TEXT NOT NULL,
+                    content_hash TEXT,
+                    phash TEXT,
+                    source_url TEXT,
+                    processed_at TEXT NOT NULL,
+                    PRIMARY KEY (shortcode, action)
+                )"""
+            )
+            self._conn.execute("CREATE INDEX IF NOT EXISTS processed_hash ON processed (action, content_hash)")
+
+    def close(self):
+        """Close the database connection."""
+        self._conn.close()
+
+    def is_done(self, shortcode, action):
+        """Return True if this shortcode already completed the given action."""
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT 1 FROM processed WHERE shortcode = ? AND action = ?", (shortcode, action)
+            ).fetchone()
+        return row is not None
+
+    def find_duplicate(self, action, content_hash, phash=None):
+        """
+        Return the shortcode of an earlier record for this action with the same
+        content hash or a perceptual hash within max_distance bits, else None.
+        """
+        with self._lock:
+            return self._find_recorded(action, content_hash, phash)
+
+    def find_or_reserve(self, shortcode, action, content_hash, phash=None):
+        """
+        Like find_duplicate, but posts other jobs are still working on count as
+        duplicates too, and when there is no duplicate the media is reserved for
+        shortcode in the same step. Follow up with record() once the action is
+        done, or release() if it fails.
+        """
+        with self._lock:
+            duplicate = (self._find_recorded(action, content_hash, phash)
+                         or self._find_pending(action, shortcode, content_hash, phash))
+            if duplicate is None:
+                self._pending.setdefault(action, {})[shortcode] = (content_hash, phash)
+            return duplicate
+
+    def release(self, shortcode, action):
+        """Drop a reservation made by find_or_reserve without recording the action."""
+        with self._lock:
+            self._pending.get(action, {}).pop(shortcode, None)
+
+    def _is_near(self, phash, other):
+        return phash is not None and other is not None and hamming_distance(phash, other) <= self.max_distance
+
+    def _find_recorded(self, action, content_hash, phash):
+        row = self._conn.execute(
+            "SELECT shortcode FROM processed WHERE action = ? AND content_hash = ?", (action, content_hash)
+        ).fetchone()
+        if row:
+            return row[0]
+        if phash is None:
+            return None
+        candidates = self._conn.execute(
+            "SELECT shortcode, phash FROM processed WHERE action = ? AND phash IS NOT NULL", (action,)
+        ).fetchall()
+        for shortcode, other in candidates:
+            if self._is_near(phash, other):
+                return shortcode
+        return None
+
+    def _find_pending(self, action, shortcode, content_hash, phash):
+        for other, (other_hash, other_phash) in self._pending.get(action, {}).items():
+            if other == shortcode or other_hash == content_hash or self._is_near(phash, other_phash):
+                return other
+        return None
+
+    def record(self, shortcode, action, content_hash=None, phash=None, source_url=None):
+        """Mark a shortcode as having completed an action, ending its reservation if it had one."""
+        with self._lock, self._conn:
+            self._pending.get(action, {}).pop(shortcode, None)
+            self._conn.execute(
+                "INSERT OR REPLACE INTO processed VALUES (?, ?, ?, ?, ?, ?)",
+                (shortcode, action, content_hash, phash, source_url, datetime.now().isoformat(timespec='seconds'))
+            )
@@ -0,0 +1,120 @@
+import json
+import os
+import subprocess
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+from metrics import trace
+
+# libx264 threads per encode; parallel job count is derived from this and the CPU count
+X264_THREADS = 2
+
+
+def probe_duration(path):
+    """Return the duration of a media file in seconds using ffprobe."""
+    command = [
+        'ffprobe',
+        '-v', 'error',
+        '-show_entries', 'format=duration',
+        '-of', 'default=noprint_wrappers=1:nokey=1',
+        path
+    ]
+    result = subprocess.run(command, capture_output=True, text=True)
+    if result.returncode != 0:
+        raise RuntimeError(f"ffprobe failed for {path}: {result.stderr.strip()}")
+    return float(result.stdout.strip())
+
+
+def settings_path(output_path):
+    """Hidden sidecar file next to output_path recording the settings it was encoded with."""
+    directory, name = os.path.split(output_path)
+    return os.path.join(directory, f".{name}.settings.json")
+
+
+def read_settings(output_path):
+    try:
+        with open(settings_path(output_path), 'r', encoding='utf-8') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def write_settings(output_path, settings):
+    with open(settings_path(output_path), 'w', encoding='utf-8') as f:
+        json.dump(settings, f, sort_keys=True)
+
+
+def is_up_to_date(output_path, inputs, settings=None):
+    """
+    Return True if output_path exists, is newer than every input file and, when
+    settings (a JSON-serializable dict) are given, was encoded with the same ones.
+    """
+    if not os.path.exists(output_path):
+        return False
+    if settings is not None and read_settings(output_path) != json.loads(json.dumps(settings)):
+        return False
+    output_mtime = os.path.getmtime(output_path)
+    return all(os.path.getmtime(path) <= output_mtime for path in inputs)
+
+
+def render_workers(threads_per_job=X264_THREADS):
+    """Number of FFmpeg jobs to run at once so that jobs x encoder threads fills the CPU."""
+    return max(1, (os.cpu_count() or 1) // max(1, threads_per_job))
+
+
+def run_ffmpeg_jobs(jobs, workers=None, threads_per_job=X264_THREADS):
+    """
+    Run independent FFmpeg jobs in parallel.
+
+    Each job is an (output_path, inputs, command) or (output_path, inputs,
+    command, settings) tuple. Jobs whose output is newer than all of its
+    inputs, and was encoded with the same settings, are skipped; the settings
+    of a successful encode are recorded next to its output. Exit codes are
+    checked and the partial output of a failed job is removed. Returns a dict
+    with the 'succeeded', 'skipped' and 'failed' output paths.
+    """
+    workers = workers or render_workers(threads_per_job)
+    summary = {'succeeded': [], 'skipped': [], 'failed': []}
+    pending = []
+    settings = {}
+    for output_path, inputs, command, *job_settings in jobs:
+        settings[output_path] = job_settings[0] if job_settings else None
+        if is_up_to_date(output_path, inputs, settings[output_path]):
+            summary['skipped'].append(output_path)
+        else:
+            pending.append((output_path, command))
+
+    def run(output_path, command):
+        # FFmpeg does the work in its own process, so a thread per job is enough to keep N encoders busy
+        with trace('ffmpeg_job', output=output_path) as span:
+            result = subprocess.run(command, capture_output=True, text=True)
+            span.set(returncode=result.returncode)
+            if result.returncode != 0:
+                for path in (output_path, settings_path(output_path)):
+                    if os.path.exists(path):
+                        os.remove(path)
+            elif os.path.exists(output_path):
+                span.add_bytes(os.path.getsize(output_path))
+        return result
+
+    started = time.monotonic()
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        futures = {executor.submit(run, output_path, command): output_path for output_path, command in pending}
+        for future in as_completed(futures):
+            output_path = futures[future]
+            result = future.result()
+            if result.returncode == 0:
+                if settings[output_path] is not None:
+                    write_settings(output_path, settings[output_path])
+                summary['succeeded'].append(output_path)
+                print(f"Created {output_path}")
+            else:
+                summary['failed'].append(output_path)
+                print(f"FFmpeg failed for {output_path} (exit code {result.returncode}):\n{result.stderr}")
+    elapsed = time.monotonic() - started
+
+    done = len(summary['succeeded'])
+    print(f"Encoded {done} videos in {elapsed:.1f}s with {workers} workers "
+          f"({done * 60 / elapsed if elapsed else 0:.1f} videos/min), "
+          f"{len(summary['skipped'])} up to date, {len(summary['failed'])} failed")
+    return summary
@@ -0,0 +1,119 @@
+import io
+import multiprocessing
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from contextlib import contextmanager
+
+from PIL import Image, ImageOps
+
+from dedup_index import content_hash
+from media_cache import cache_key, get_cache
+from metrics import trace
+
+# Worker processes decoding and rescaling images; shared by every render in this process. They are spawned,
+# not forked: the pool starts from worker threads while HTTP and TTS threads may hold locks a fork would copy
+PREP_WORKERS = os.cpu_count() or 1
+
+# Render-ready frames are RGB PNGs with light compression: lossless and quick for FFmpeg to decode
+PNG_COMPRESS_LEVEL = 1
+
+cache = get_cache()
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def get_pool():
+    """Return the shared process pool, starting it on first use."""
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            _pool = ProcessPoolExecutor(max_workers=PREP_WORKERS, mp_context=multiprocessing.get_context('spawn'))
+        return _pool
+
+
+def discard_pool(pool):
+    """Drop a broken pool (a worker died) so the next get_pool() starts a fresh one."""
+    global _pool
+    with _pool_lock:
+        if _pool is pool:
+            _pool = None
+    pool.shutdown(wait=False, cancel_futures=True)
+
+
+def even_size(width, height):
+    """Round dimensions down to even numbers, as yuv420p requires."""
+    return max(2, int(width) // 2 * 2), max(2, int(height) // 2 * 2)
+
+
+def normalize_image(source, width, height, fit='cover'):
+    """
+    Decode an image once and return it as render-ready PNG bytes sized to width x height.
+
+    EXIF rotation is applied and any mode (palette, alpha, CMYK) is converted
+    to RGB. 'cover' crops the image to fill the frame; 'contain' fits it
+    inside and pads the rest with black; 'within' only scales it to fit inside,
+    keeping its aspect ratio (so the result may be smaller than width x height).
+    """
+    size = even_size(width, height)
+    with Image.open(source) as image:
+        # Let the JPEG decoder downscale by a power of two while decoding, before the exact resize
+        image.draft('RGB', size)
+        image = ImageOps.exif_transpose(image).convert('RGB')
+    if fit == 'cover':
+        image = ImageOps.fit(image, size, Image.LANCZOS)
+    elif fit == 'contain':
+        image = ImageOps.pad(image, size, Image.LANCZOS, color=(0, 0, 0))
+    elif fit == 'within':
+        image = ImageOps.contain(image, size, Image.LANCZOS)
+        image = image.crop((0, 0, *even_size(*image.size)))
+    else:
+        raise ValueError(f"Unknown fit '{fit}', expected 'cover', 'contain' or 'within'")
+    buffer = io.BytesIO()
+    image.save(buffer, 'PNG', compress_level=PNG_COMPRESS_LEVEL)
+    return buffer.getvalue()
+
+
+@contextmanager
+def prepare_frames(paths, width, height, fit='cover'):
+    """
+    Provide render-ready copies of images at width x height (rounded down to even).
+
+    Used as `with prepare_frames(paths, width, height) as frames:`. Frames
+    are cached by the source file's content hash and the target size, so
+    repeated renders of the same assets skip the decode and rescale. Misses
+    are normalized in the shared process pool. frames has one path per input
+    in order, or None for images that could not be decoded. The cache entries
+    are pinned until the block exits, so other renders' writes cannot evict
+    them while FFmpeg reads them.
+    """
+    size = even_size(width, height)
+    keys = [cache_key('frame', content_hash(path), *size, fit) for path in paths]
+    with cache.pinned([cache.path(key, '.png') for key in keys]):
+        prepared = [cache.get(key, '.png') for key in keys]
+        misses = [i for i, path in enumerate(prepared) if path is None]
+
+        with trace('image_prep', frames=len(paths)) as span:
+            span.set(cache_hits=len(paths) - len(misses))
+            pool = get_pool() if misses else None
+            futures = {}
+            for i in misses:
+                try:
+                    futures[i] = pool.submit(normalize_image, paths[i], *size, fit)
+                except BrokenProcessPool as e:
+                    discard_pool(pool)
+                    print(f"Could not prepare image '{paths[i]}': {e}")
+            for i, future in futures.items():
+                try:
+                    data = future.result()
+                except BrokenProcessPool as e:
+                    discard_pool(pool)
+                    print(f"Could not prepare image '{paths[i]}': {e}")
+                    continue
+                except Exception as e:
+                    print(f"Could not prepare image '{paths[i]}': {e}")
+                    continue
+                span.add_bytes(len(data))
+                prepared[i] = cache.put(keys[i], data, '.png')
+        yield prepared
@@ -1,8 +1,9 @@
 import logging
 import asyncio
 import aiohttp
-from playwright.async_api import async_playwright
+from playwright.async_api import async_playwright, TimeoutError as PlaywrightTimeoutError
 from instaloader import Instaloader, Post
+from instaloader.exceptions import ConnectionException, QueryReturnedNotFoundException, TooManyRequestsException
 from dotenv import load_dotenv
 import google.generativeai as genai
 import os
@@ -10,7 +11,16 @@ import sys
 import shutil
 import json
 import re
-import subprocess
+import tempfile
+from dataclasses import dataclass
+
+from dedup_index import IMAGE_EXTENSIONS, DedupIndex, content_hash, perceptual_hash
+from ffmpeg_utils import X264_THREADS, is_up_to_date, probe_duration, render_workers, run_ffmpeg_jobs
+from image_prep import prepare_frames
+import outbound
+from metrics import current_span, traced
+from render_engine import DEFAULT_PRESET, MOTIONS, OUTPUT_FORMATS, clip_filter, encoder_args, frame_size, get_preset
+from video_generation import render_slideshow_formats
 
 # Load environment variables
 load_dotenv()
@@ -19,6 +29,29 @@ FLIC_TOKEN = os.getenv('FLIC_TOKEN')
 if not FLIC_TOKEN:
     raise Exception("FLIC_TOKEN is not set in the environment. Check your .env file or environment variables.")
 
+# Instagram download settings: posts fetched at once, retries and base backoff (seconds) on HTTP 429
+INSTAGRAM_CONCURRENCY = 4
+INSTAGRAM_MAX_RETRIES = 4
+INSTAGRAM_BACKOFF_SECONDS = 5
+INSTAGRAM_HOST = 'www.instagram.com'
+
+# Socialverse settings: API root, uploads in flight at once, streaming chunk size and PUT retries
+SOCIALVERSE_API = 'https://api.socialverseapp.com'
+UPLOAD_CONCURRENCY = 4
+UPLOAD_CHUNK_SIZE = 1024 * 1024
+UPLOAD_MAX_RETRIES = 3
+
+# Rendered video variants of image posts (see process_media_url) are kept here; posts are rendered at most
+# render_workers() at a time, however many are processed concurrently
+VARIANTS_DIR = 'output_videos'
+variant_render_semaphore = asyncio.Semaphore(render_workers())
+
+# Hashtag harvesting: saved login session, posts per hashtag and scrolls allowed without new posts
+STORAGE_STATE_FILE = 'instagram_state.json'
+HARVEST_LIMIT = 20
+MAX_IDLE_SCROLLS = 3
+SHORTCODE_PATTERN = re.compile(r'"(?:shortcode|code)":"([A-Za-z0-9_-]{6,})"')
+
 # Configure logging
 logging.basicConfig(filename='relevant_urls.log', level=logging.INFO, format='%(asctime)s - %(message)s')
 
@@ -34,71 +67,145 @@ async def login_to_instagram(page):
     await page.wait_for_load_state("networkidle")
     print("Logged in successfully.")
 
-# Function to scroll down the page
-async def scroll_down(page):
-    """
-    Scroll down the page to load more posts.
+class HashtagHarvester:
     """
-    for _ in range(5):  # Scroll 5 times to load content
-        await page.evaluate("window.scrollBy(0, document.body.scrollHeight)")
-        await asyncio.sleep(2)
+    Collects post URLs from hashtag pages with one reusable headless browser.
 
-async def fetch_instagram_post_urls(hashtag: str):
+    The logged-in session is saved to `storage_state` and reused on later runs,
+    so logging in only happens when the session is missing or has expired. Post
+    links are read from the page's GraphQL/API responses and anchors, without
+    opening each post, and scrolling stops as soon as enough unique links are found.
     """
-    Fetch posts from Instagram for a specific hashtag and save their URLs.
-    """
-    async with async_playwright() as p:
-        browser = await p.chromium.launch(headless=False)
-        context = await browser.new_context()
-        page = await context.new_page()
-
-        await login_to_instagram(page)
 
+    def __init__(self, headless: bool = True, storage_state: str = STORAGE_STATE_FILE):
+        self.headless = headless
+        self.storage_state = storage_state
+        self.playwright = None
+        self.browser = None
+        self.context = None
+
+    async def __aenter__(self):
+        await self.start()
+        return self
+
+    async def __aexit__(self, *exc_info):
+        await self.close()
+
+    async def start(self) -> None:
+        """
+        Launch the browser and open a context with the saved session, if there is one.
+        """
+        self.playwright = await async_playwright().start()
+        self.browser = await self.playwright.chromium.launch(headless=self.headless)
+        state = self.storage_state if os.path.exists(self.storage_state) else None
+        self.context = await self.browser.new_context(storage_state=state)
+
+    async def close(self) -> None:
+        """
+        Close the browser.
+        """
+        if self.browser:
+            await self.browser.close()
+        if self.playwright:
+            await self.playwright.stop()
+
+    async def _open_tag_page(self, page, hashtag: str) -> None:
         url = f"https://www.instagram.com/explore/tags/{hashtag}/"
         await page.goto(url)
-        await scroll_down(page)
-        await page.wait_for_selector('a[href*="/p/"]', timeout=60000)
+        if 'accounts/login' in page.url:
+            # No saved session or it expired: log in once and save it for the next run
+            await login_to_instagram(page)
+            await self.context.storage_state(path=self.storage_state)
+            await page.goto(url)
+
+    async def harvest(self, hashtag: str, limit: int = HARVEST_LIMIT) -> list:
+        """
+        Return up to `limit` unique post URLs for a hashtag.
+        """
+        shortcodes = {}
+
+        async def collect_from_response(response):
+            if 'graphql' not in response.url and '/api/v1/' not in response.url:
+                return
+            try:
+                body = await response.text()
+            except Exception:
+                return
+            for shortcode in SHORTCODE_PATTERN.findall(body):
+                shortcodes.setdefault(shortcode, None)
+
+        page = await self.context.new_page()
+        page.on("response", collect_from_response)
+        try:
+            await self._open_tag_page(page, hashtag)
+
+            idle_scrolls = 0
+            while len(shortcodes) < limit and idle_scrolls < MAX_IDLE_SCROLLS:
+                before = len(shortcodes)
+                links = await page.eval_on_selector_all(
+                    'a[href*="/p/"], a[href*="/reel/"]', "els => els.map(e => e.getAttribute('href'))"
+                )
+                for link in links:
+                    try:
+                        shortcodes.setdefault(extract_shortcode(link), None)
+                    except ValueError:
+                        continue
+                if len(shortcodes) >= limit:
+                    break
+
+                await page.evaluate("window.scrollBy(0, document.body.scrollHeight)")
+                try:
+                    # Wait only as long as the next batch of posts takes to load
+                    await page.wait_for_load_state("networkidle", timeout=5000)
+                except PlaywrightTimeoutError:
+                    pass
+                idle_scrolls = idle_scrolls + 1 if len(shortcodes) == before else 0
+        finally:
+            await page.close()
 
-        posts = await page.query_selector_all('a[href*="/p/"]')
         saved_urls = []
+        for shortcode in list(shortcodes)[:limit]:
+            full_url = f"https://www.instagram.com/p/{shortcode}/"
+            saved_urls.append(full_url)
+            logging.info(f"Saved URL: {full_url}")
+            print(f"Saved URL: {full_url}")
+        return saved_urls
 
-        for post in posts[:20]:  # Limit to 20 posts
-            try:
-                link = await post.get_attribute('href')
-                if not link:
-                    continue
-
-                # Open the post in popup mode
-                await post.click()
-                await asyncio.sleep(2)
-
-                # Save the post URL
-                full_url = f"https://www.instagram.com{link}"
-                saved_urls.append(full_url)
-                logging.info(f"Saved URL: {full_url}")
-                print(f"Saved URL: {full_url}")
-
-                # Close the post dialog
-                close_button = await page.query_selector('div[role="dialog"] button[aria-label="Close"]')
-                if close_button:
-                    await close_button.click()
-
-            except Exception as e:
-                print(f"Error processing post: {e}")
-                continue
+async def fetch_instagram_post_urls(hashtag: str, harvester: HashtagHarvester = None):
+    """
+    Fetch posts from Instagram for a specific hashtag and save their URLs.
 
-        await browser.close()
-        return saved_urls
+    Pass a started HashtagHarvester to reuse its browser across hashtags.
+    """
+    if harvester:
+        return await harvester.harvest(hashtag)
+    async with HashtagHarvester() as harvester:
+        return await harvester.harvest(hashtag)
+
+# Gemini model shared by every hashtag generation
+hashtag_model = None
+
+def get_hashtag_model():
+    """
+    Return the shared Gemini model, configuring the client on first use.
+    """
+    global hashtag_model
+    if hashtag_model is None:
+        genai.configure(api_key="gemini_api_key")  # Provide your Gemini API key
+        hashtag_model = genai.GenerativeModel("gemini-1.5-flash")
+    return hashtag_model
 
 def generate_hashtag_from_prompt(prompt: str) -> str:
     """
     Generate a hashtag based on the provided prompt using the Gemini model.
     """
-    genai.configure(api_key="gemini_api_key")  # Provide your Gemini API key
-    model = genai.GenerativeModel("gemini-1.5-flash")
-
-    # Generate content
-    response = model.generate_content(f"Create one most relevant Instagram hashtag for the following prompt: '{prompt}' which cheers me up or motivate or calm me down which is only one word")
+    # Generate content through the shared Gemini limiter, with the same retries as content.py's storyline requests
+    response = outbound.call(
+        outbound.GEMINI_HOST, get_hashtag_model().generate_content,
+        f"Create one most relevant Instagram hashtag for the following prompt: '{prompt}' which cheers me up or motivate or calm me down which is only one word",
+        throttle_on=outbound.GEMINI_THROTTLE_ERRORS,
+        retry_on=outbound.GEMINI_RETRY_ERRORS
+    )
     hashtag = response.text.strip()
     return hashtag
 
@@ -119,176 +226,553 @@ def extract_shortcode(url: str) -> str:
     except IndexError:
         raise ValueError("Unable to extract shortcode. Check the URL format.")
 
-async def download_from_instagram(url: str) -> None:
+def surface_rate_limits(func, *args, **kwargs):
     """
-    Download an Instagram post (image or video) given its URL and save it to the 'media' directory.
+    Run an Instaloader call, re-raising a 429 as TooManyRequestsException.
+
+    Instaloader reports its final failed attempt as a plain ConnectionException,
+    with the 429 only as its cause (JSON queries) or in its message (downloads).
     """
-    il = Instaloader()
-    shortcode = extract_shortcode(url)
-    post = Post.from_shortcode(il.context, shortcode)
+    try:
+        return func(*args, **kwargs)
+    except TooManyRequestsException:
+        raise
+    except ConnectionException as e:
+        if isinstance(e.__cause__, TooManyRequestsException) or '429 Too Many Requests' in str(e):
+            raise TooManyRequestsException(str(e)) from e
+        raise
+
+@dataclass
+class MediaJob:
+    """
+    A downloaded Instagram post and the working directory that holds it.
+    """
+    shortcode: str
+    source_url: str
+    workdir: str
+    media_path: str
+    caption: str
+
+    def cleanup(self) -> None:
+        """
+        Remove the job's working directory.
+        """
+        shutil.rmtree(self.workdir, ignore_errors=True)
+
+class InstagramDownloader:
+    """
+    Shared Instagram downloader.
 
-    os.makedirs('media', exist_ok=True)
+    One Instaloader context and one aiohttp connection pool are reused for every
+    post. The blocking Instaloader calls run on worker threads so they don't stall
+    the event loop, at most `concurrency` posts are fetched at once, and every
+    request goes through the outbound limiter, which paces, retries and backs
+    off when Instagram rate-limits (HTTP 429).
+    """
 
-    if post.is_video:
-        il.download_post(post, target='media')
-    else:
-        post_url = post.url
-        async with aiohttp.ClientSession() as session:
-            async with session.get(post_url) as response:
-                if response.status == 200:
-                    image_data = await response.read()
-                    with open(f"media/{shortcode}.jpg", "wb") as f:
-                        f.write(image_data)
+    def __init__(self, concurrency: int = INSTAGRAM_CONCURRENCY, max_retries: int = INSTAGRAM_MAX_RETRIES):
+        # Name downloaded files after the shortcode so concurrent posts never collide
+        # One attempt per call: retries and 429 backoff belong to the outbound limiter, not Instaloader
+        self.loader = Instaloader(
+            max_connection_attempts=1,
+            filename_pattern='{shortcode}',
+            download_comments=False,
+            download_geotags=False,
+            save_metadata=False,
+            compress_json=False,
+        )
+        self.semaphore = asyncio.Semaphore(concurrency)
+        self.max_retries = max_retries
+        self.session = None
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc_info):
+        await self.close()
+
+    async def close(self) -> None:
+        """
+        Close the shared HTTP session.
+        """
+        if self.session and not self.session.closed:
+            await self.session.close()
+
+    def _get_session(self) -> aiohttp.ClientSession:
+        if self.session is None or self.session.closed:
+            self.session = aiohttp.ClientSession(connector=aiohttp.TCPConnector(limit=INSTAGRAM_CONCURRENCY * 2))
+        return self.session
+
+    async def _run_blocking(self, func, *args, **kwargs):
+        """
+        Run a blocking Instaloader call on a worker thread, backing off when rate limited.
+        """
+        return await asyncio.to_thread(
+            outbound.call, INSTAGRAM_HOST, surface_rate_limits, func, *args, retries=self.max_retries,
+            throttle_on=(TooManyRequestsException,), retry_on=(ConnectionException,),
+            give_up_on=(QueryReturnedNotFoundException,), backoff=INSTAGRAM_BACKOFF_SECONDS, **kwargs
+        )
+
+    async def _fetch_image(self, image_url: str, path: str) -> None:
+        async with outbound.arequest(self._get_session(), 'GET', image_url, retries=self.max_retries,
+                                     backoff=INSTAGRAM_BACKOFF_SECONDS) as response:
+            if response.status != 200:
+                raise Exception(f"Failed to download image: {response.status}")
+            image_data = await response.read()
+        with open(path, "wb") as f:
+            f.write(image_data)
+
+    async def fetch_post(self, shortcode: str) -> Post:
+        """
+        Fetch a post's metadata (is_video, url, caption) from Instagram.
+        """
+        return await self._run_blocking(Post.from_shortcode, self.loader.context, shortcode)
+
+    @traced('instagram_download')
+    async def download(self, url: str, workdir: str = None) -> MediaJob:
+        """
+        Download an Instagram post (image or video) into its own working directory.
+
+        The directory defaults to a fresh temp directory named after the shortcode,
+        so concurrent jobs never see each other's files.
+        """
+        shortcode = extract_shortcode(url)
+        if workdir is None:
+            workdir = tempfile.mkdtemp(prefix=f"{shortcode}_")
+        else:
+            os.makedirs(workdir, exist_ok=True)
 
-    title = post.caption if post.caption else "Untitled Post"
+        async with self.semaphore:
+            post = await self.fetch_post(shortcode)
 
-    with open(f"media/{shortcode}.txt", 'w', encoding='utf-8') as title_file:
-        title_file.write(title)
+            if post.is_video:
+                await self._run_blocking(self.loader.download_post, post, target=workdir)
+                media_path = os.path.join(workdir, f"{shortcode}.mp4")
+            else:
+                media_path = os.path.join(workdir, f"{shortcode}.jpg")
+                await self._fetch_image(post.url, media_path)
+
+        if not os.path.exists(media_path):
+            raise Exception(f"No media file found for {shortcode} in '{workdir}'.")
+        current_span().add_bytes(os.path.getsize(media_path))
+
+        return MediaJob(
+            shortcode=shortcode,
+            source_url=url,
+            workdir=workdir,
+            media_path=media_path,
+            caption=post.caption if post.caption else "Untitled Post",
+        )
+
+    async def download_many(self, urls: list) -> list:
+        """
+        Download several posts concurrently. Returns a MediaJob or an exception per URL, in order.
+        """
+        return await asyncio.gather(*(self.download(url) for url in urls), return_exceptions=True)
+
+# Downloader shared by every call to download_from_instagram
+downloader = None
+
+def get_downloader() -> InstagramDownloader:
+    """
+    Return the shared InstagramDownloader, creating it on first use.
+    """
+    global downloader
+    if downloader is None:
+        downloader = InstagramDownloader()
+    return downloader
 
-    for file in os.listdir('media'):
-        if not file.endswith('.mp4') and not file.endswith('.jpg') and not file.endswith('.txt'):
-            os.remove(os.path.join('media', file))
+async def download_from_instagram(url: str, workdir: str = None) -> MediaJob:
+    """
+    Download an Instagram post (image or video) given its URL into a per-job working directory.
+    """
+    return await get_downloader().download(url, workdir)
 
-async def generate_upload_url() -> dict:
+class SocialverseClient:
     """
-    Generate a pre-signed upload URL from the API.
+    Socialverse API client holding one pooled HTTP session for every call.
+
+    Media is streamed to the pre-signed URL in chunks (with an optional progress
+    callback) and failed PUTs are retried. Upload URLs are requested ahead of
+    time, so the next upload never waits for one, and at most
+    `upload_concurrency` uploads run at once.
     """
-    endpoint = 'https://api.socialverseapp.com/posts/generate-upload-url'
-    headers = {
-        'Flic-Token': FLIC_TOKEN,
-        'Content-Type': 'application/json'
-    }
-    async with aiohttp.ClientSession() as session:
-        async with session.get(endpoint, headers=headers) as response:
+
+    def __init__(self, token: str = FLIC_TOKEN, upload_concurrency: int = UPLOAD_CONCURRENCY,
+                 chunk_size: int = UPLOAD_CHUNK_SIZE, max_retries: int = UPLOAD_MAX_RETRIES):
+        self.headers = {
+            'Flic-Token': token,
+            'Content-Type': 'application/json'
+        }
+        self.upload_semaphore = asyncio.Semaphore(upload_concurrency)
+        self.waiting = 0
+        self.chunk_size = chunk_size
+        self.max_retries = max_retries
+        self.upload_urls = asyncio.Queue()
+        self.pending_urls = set()
+        self.url_errors = []
+        self.session = None
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc_info):
+        await self.close()
+
+    async def close(self) -> None:
+        """
+        Cancel outstanding URL prefetches and close the shared HTTP session.
+        """
+        for task in self.pending_urls:
+            task.cancel()
+        if self.session and not self.session.closed:
+            await self.session.close()
+
+    def _get_session(self) -> aiohttp.ClientSession:
+        if self.session is None or self.session.closed:
+            self.session = aiohttp.ClientSession(connector=aiohttp.TCPConnector(limit=UPLOAD_CONCURRENCY * 2))
+        return self.session
+
+    @traced('socialverse_upload_url')
+    async def generate_upload_url(self) -> dict:
+        """
+        Generate a pre-signed upload URL from the API.
+        """
+        endpoint = f'{SOCIALVERSE_API}/posts/generate-upload-url'
+        async with outbound.arequest(self._get_session(), 'GET', endpoint, headers=self.headers) as response:
             if response.status == 200:
                 return await response.json()
             else:
                 raise Exception(f"Failed to generate upload URL: {response.status}, {await response.text()}")
 
+    def _prefetch_upload_urls(self) -> None:
+        # Cover every caller waiting for a URL, plus one ready for the next upload
+        while self.upload_urls.qsize() + len(self.pending_urls) < self.waiting + 1:
+            task = asyncio.create_task(self.generate_upload_url())
+            self.pending_urls.add(task)
+            task.add_done_callback(self._store_upload_url)
+
+    def _store_upload_url(self, task: asyncio.Task) -> None:
+        self.pending_urls.discard(task)
+        if task.cancelled():
+            return
+        if task.exception() is None:
+            self.url_errors.clear()
+            self.upload_urls.put_nowait(task.result())
+        else:
+            self.url_errors.append(task.exception())
+
+    async def next_upload_url(self) -> dict:
+        """
+        Return a pre-signed upload URL, using one fetched ahead of time when available.
+
+        A failed request is only reported once no URL is queued or in flight,
+        and each failure to a single caller.
+        """
+        self.waiting += 1
+        try:
+            self._prefetch_upload_urls()
+            while self.upload_urls.empty():
+                if self.pending_urls:
+                    # Wait for an in-flight request rather than issuing another one
+                    await asyncio.wait(set(self.pending_urls), return_when=asyncio.FIRST_COMPLETED)
+                elif self.url_errors:
+                    raise self.url_errors.pop()
+                else:
+                    self._prefetch_upload_urls()
+        finally:
+            self.waiting -= 1
+        upload_data = self.upload_urls.get_nowait()
+        self._prefetch_upload_urls()
+        return upload_data
+
+    async def _read_chunks(self, file_path: str, total: int, progress=None):
+        sent = 0
+        with open(file_path, 'rb') as file:
+            while chunk := await asyncio.to_thread(file.read, self.chunk_size):
+                yield chunk
+                sent += len(chunk)
+                if progress:
+                    progress(file_path, sent, total)
+
+    @traced('socialverse_upload')
+    async def upload_media(self, upload_url: str, file_path: str, progress=None) -> None:
+        """
+        Stream the media file to the pre-signed URL in chunks, retrying failed uploads.
+
+        progress, if given, is called as progress(file_path, bytes_sent, total_bytes).
+        """
+        total = os.path.getsize(file_path)
+        # An explicit length keeps the body un-chunked, which pre-signed URLs require
+        headers = {'Content-Length': str(total)}
+        try:
+            # The body is a callable so every retry streams the file again from the start
+            async with outbound.arequest(
+                self._get_session(), 'PUT', upload_url, retries=self.max_retries,
+                data=lambda: self._read_chunks(file_path, total, progress), headers=headers
+            ) as response:
+                if response.status != 200:
+                    raise Exception(f"Failed to upload media: {response.status}, {await response.text()}")
+        except aiohttp.ClientError as e:
+            raise Exception(f"Failed to upload media: {e}")
+        current_span().add_bytes(total)
+
+    @traced('socialverse_create_post')
+    async def create_post(self, hash_value: str, title: str, category_id: int = 69) -> None:
+        """
+        Create a post on the Socialverse platform using the media hash.
+        """
+        endpoint = f'{SOCIALVERSE_API}/posts'
+        body = {
+            "title": title,
+            "hash": hash_value,
+            "is_available_in_public_feed": False,
+            "category_id": category_id
+        }
+        # Creating a post isn't idempotent, so only retry when the API says it never processed the request
+        async with outbound.arequest(self._get_session(), 'POST', endpoint, retry_statuses=(429,),
+                                     headers=self.headers, json=body) as response:
+            if response.status != 200:
+                raise Exception(f"Failed to create post: {response.status}, {await response.text()}")
+
+    async def publish(self, file_path: str, title: str, category_id: int = 69, progress=None) -> str:
+        """
+        Upload a media file and create a post for it. Returns the media hash.
+        """
+        upload_data = await self.next_upload_url()
+        async with self.upload_semaphore:
+            await self.upload_media(upload_data['url'], file_path, progress)
+        await self.create_post(upload_data['hash'], title, category_id)
+        return upload_data['hash']
+
+# Client shared by every Socialverse call
+socialverse = None
+
+def get_socialverse_client() -> SocialverseClient:
+    """
+    Return the shared SocialverseClient, creating it on first use.
+    """
+    global socialverse
+    if socialverse is None:
+        socialverse = SocialverseClient()
+    return socialverse
+
+async def generate_upload_url() -> dict:
+    """
+    Generate a pre-signed upload URL from the API.
+    """
+    return await get_socialverse_client().generate_upload_url()
+
 async def upload_media_to_url(upload_url: str, file_path: str) -> None:
     """
     Upload the media file to the server using the pre-signed URL.
     """
-    async with aiohttp.ClientSession() as session:
-        with open(file_path, 'rb') as file:
-            async with session.put(upload_url, data=file) as response:
-                if response.status != 200:
-                    raise Exception(f"Failed to upload media: {response.status}, {await response.text()}")
+    await get_socialverse_client().upload_media(upload_url, file_path)
 
 async def create_post(hash_value: str, title: str, category_id: int = 69) -> None:
     """
     Create a post on the Socialverse platform using the media hash.
     """
-    endpoint = 'https://api.socialverseapp.com/posts'
-    headers = {
-        'Flic-Token': FLIC_TOKEN,
-        'Content-Type': 'application/json'
-    }
-    body = {
-        "title": title,
-        "hash": hash_value,
-        "is_available_in_public_feed": False,
-        "category_id": category_id
-    }
-    async with aiohttp.ClientSession() as session:
-        async with session.post(endpoint, headers=headers, json=body) as response:
-            if response.status != 200:
-                raise Exception(f"Failed to create post: {response.status}, {await response.text()}")
+    await get_socialverse_client().create_post(hash_value, title, category_id)
 
-async def process_media_url(url: str) -> None:
+def print_upload_progress(file_path: str, sent: int, total: int) -> None:
     """
-    End-to-end process: download, upload, and create a post for an Instagram post.
+    Print upload progress for a file in 25% steps.
     """
-    print(f"Processing URL: {url}")
-    await download_from_instagram(url)
-
-    media_files = [file for file in os.listdir('media') if file.endswith('.mp4') or file.endswith('.jpg')]
-    if not media_files:
-        raise Exception("No media file found in 'media' directory.")
-    media_file_path = os.path.join('media', media_files[0])
+    step = max(1, total // 4)
+    if sent == total or sent // step != (sent - UPLOAD_CHUNK_SIZE) // step:
+        print(f"Uploading {os.path.basename(file_path)}: {sent * 100 // max(1, total)}%")
 
-    upload_data = await generate_upload_url()
-    upload_url = upload_data['url']
-    hash_value = upload_data['hash']
+# Index of posts already downloaded or uploaded, shared by every job
+dedup = None
 
-    await upload_media_to_url(upload_url, media_file_path)
+def get_dedup_index() -> DedupIndex:
+    """
+    Return the shared DedupIndex, creating it on first use.
+    """
+    global dedup
+    if dedup is None:
+        dedup = DedupIndex()
+    return dedup
 
-    title_file = [file for file in os.listdir('media') if file.endswith('.txt')]
-    if not title_file:
-        raise Exception("No title file found in 'media' directory.")
-    
-    with open(os.path.join('media', title_file[0]), 'r', encoding='utf-8') as f:
-        title = f.read()
+async def check_duplicate(job: MediaJob, action: str) -> tuple:
+    """
+    Hash the job's media and look for an earlier or in-progress post with the same or a near-identical file.
+    Without one, the media is reserved for this job until it is recorded or released.
+    Returns (duplicate shortcode or None, content hash, perceptual hash).
+    """
+    media_hash = await asyncio.to_thread(content_hash, job.media_path)
+    phash = await asyncio.to_thread(perceptual_hash, job.media_path)
+    return get_dedup_index().find_or_reserve(job.shortcode, action, media_hash, phash), media_hash, phash
 
-    await create_post(hash_value, title)
-    print(f"Process completed successfully for {url}: Media uploaded and post created.")
+def record_skipped(job: MediaJob, action: str, duplicate: str, media_hash: str, phash: str) -> None:
+    """
+    Record a post skipped as a duplicate, unless the duplicate is the same post
+    still being processed by another job (which may yet fail).
+    """
+    if duplicate != job.shortcode:
+        get_dedup_index().record(job.shortcode, action, media_hash, phash, job.source_url)
 
-async def process_post(url: str) -> None:
+def render_post_variants(job: MediaJob, audio_file: str, formats=tuple(OUTPUT_FORMATS)) -> dict:
     """
-    Process the Instagram post by downloading it and saving the media and metadata locally.
+    Render an image post over audio_file in every format with one FFmpeg pass.
+    Returns a dict of format name to video path; video posts have no variants.
     """
-    await download_from_instagram(url)
+    if not job.media_path.lower().endswith(IMAGE_EXTENSIONS):
+        return {}
+    return render_slideshow_formats([job.media_path], audio_file, os.path.join(VARIANTS_DIR, f"{job.shortcode}.mp4"),
+                                    formats)
 
-    media_files = [file for file in os.listdir('media') if file.endswith('.mp4') or file.endswith('.jpg')]
-    if not media_files:
-        raise Exception("No media file found in 'media' directory.")
-    media_file_path = os.path.join('media', media_files[0])
+def pick_variant(variants: dict, video_format: str, fallback: str) -> str:
+    """
+    Return the variant in the requested format, or fallback if it wasn't rendered.
+    """
+    if video_format in variants:
+        return variants[video_format]
+    print(f"No {video_format} variant available, uploading {fallback} instead.")
+    return fallback
 
-    title_file = [file for file in os.listdir('media') if file.endswith('.txt')]
-    if not title_file:
-        raise Exception("No title file found in 'media' directory.")
-    with open(os.path.join('media', title_file[0]), 'r', encoding='utf-8') as f:
-        title = f.read().strip()
+async def process_media_url(url: str, video_format: str = None, audio_file: str = None) -> None:
+    """
+    End-to-end process: download, upload, and create a post for an Instagram post.
+    Posts that were already uploaded, or whose media duplicates an uploaded one, are skipped.
 
-    save_directory = "local_media"
-    os.makedirs(save_directory, exist_ok=True)
+    With a video_format (e.g. 'vertical') and an audio_file, an image post is
+    first rendered into all OUTPUT_FORMATS at once, kept in VARIANTS_DIR, and
+    the requested variant is uploaded instead of the image.
+    """
+    shortcode = extract_shortcode(url)
+    if get_dedup_index().is_done(shortcode, 'uploaded'):
+        print(f"Skipping {url}: already uploaded.")
+        return
 
-    saved_media_path = os.path.join(save_directory, os.path.basename(media_file_path))
-    shutil.move(media_file_path, saved_media_path)
+    print(f"Processing URL: {url}")
+    job = await download_from_instagram(url)
+    try:
+        duplicate, media_hash, phash = await check_duplicate(job, 'uploaded')
+        if duplicate:
+            print(f"Skipping {url}: media duplicates uploaded post {duplicate}.")
+            record_skipped(job, 'uploaded', duplicate, media_hash, phash)
+            return
+        try:
+            upload_path = job.media_path
+            if video_format and audio_file:
+                async with variant_render_semaphore:
+                    variants = await asyncio.to_thread(render_post_variants, job, audio_file)
+                upload_path = pick_variant(variants, video_format, job.media_path)
+            await get_socialverse_client().publish(upload_path, job.caption, progress=print_upload_progress)
+        except BaseException:
+            get_dedup_index().release(shortcode, 'uploaded')
+            raise
+        get_dedup_index().record(shortcode, 'uploaded', media_hash, phash, url)
+        print(f"Process completed successfully for {url}: Media uploaded and post created.")
+    finally:
+        job.cleanup()
+
+async def process_post(url: str) -> dict:
+    """
+    Process the Instagram post by downloading it and saving the media and metadata locally.
+    Posts that were already saved, or whose media duplicates a saved one, are skipped.
+    """
+    shortcode = extract_shortcode(url)
+    if get_dedup_index().is_done(shortcode, 'downloaded'):
+        print(f"Skipping {url}: already downloaded.")
+        return None
 
-    metadata = {
-        "title": title,
-        "media_file": saved_media_path,
-        "source_url": url
-    }
-    metadata_file = os.path.join(save_directory, "metadata.json")
-    with open(metadata_file, 'w', encoding='utf-8') as meta_file:
-        json.dump(metadata, meta_file, indent=4)
+    job = await download_from_instagram(url)
+    try:
+        duplicate, media_hash, phash = await check_duplicate(job, 'downloaded')
+        if duplicate:
+            print(f"Skipping {url}: media duplicates downloaded post {duplicate}.")
+            record_skipped(job, 'downloaded', duplicate, media_hash, phash)
+            return None
+        try:
+            save_directory = "local_media"
+            os.makedirs(save_directory, exist_ok=True)
+
+            saved_media_path = os.path.join(save_directory, os.path.basename(job.media_path))
+            shutil.move(job.media_path, saved_media_path)
+
+            metadata = {
+                "shortcode": job.shortcode,
+                "title": job.caption.strip(),
+                "media_file": saved_media_path,
+                "source_url": url
+            }
+            # One JSON object per line, so concurrent jobs append instead of overwriting each other
+            metadata_file = os.path.join(save_directory, "metadata.jsonl")
+            with open(metadata_file, 'a', encoding='utf-8') as meta_file:
+                meta_file.write(json.dumps(metadata, ensure_ascii=False) + "\n")
+        except BaseException:
+            get_dedup_index().release(shortcode, 'downloaded')
+            raise
+        get_dedup_index().record(shortcode, 'downloaded', media_hash, phash, url)
+    finally:
+        job.cleanup()
 
     print(f"Media and metadata saved locally:\n- Media: {saved_media_path}\n- Metadata: {metadata_file}")
-    shutil.rmtree('media')
+    return metadata
 
-def create_videos_with_audio():
+def create_videos_with_audio(image_dir='local_media', audio_file='audio.mp3', output_dir='output_videos',
+                             threads=X264_THREADS, workers=None, preset=DEFAULT_PRESET, motion=False,
+                             width=1080, height=1080):
     """
-    Create videos from images with audio.
+    Create videos from images with audio, running several FFmpeg encodes in parallel.
+
+    Each image is normalized once by image_prep (cached across runs) and held
+    (or, with motion, panned/zoomed) for the length of the audio, encoded with
+    the named render_engine preset.
     """
-    image_dir = 'local_media'
-    audio_file = 'audio.mp3'
-    output_dir = 'output_videos'
-    
     os.makedirs(output_dir, exist_ok=True)
-    
-    for image_file in os.listdir(image_dir):
-        if image_file.endswith(('.jpg', '.jpeg', '.png')):
-            image_path = os.path.join(image_dir, image_file)
-            output_video_path = os.path.join(output_dir, f'{os.path.splitext(image_file)[0]}_video.mp4')
-            
+    duration = probe_duration(audio_file)
+    fps = get_preset(preset)['fps']
+
+    image_files = [name for name in sorted(os.listdir(image_dir)) if name.endswith(('.jpg', '.jpeg', '.png'))]
+    # Check outputs against their inputs and encode settings first, so up-to-date ones skip frame prep
+    skipped, stale = [], []
+    for i, image_file in enumerate(image_files):
+        source = os.path.join(image_dir, image_file)
+        output_video_path = os.path.join(output_dir, f'{os.path.splitext(image_file)[0]}_video.mp4')
+        settings = {'preset': preset, 'motion': MOTIONS[i % len(MOTIONS)] if motion else None,
+                    'width': width, 'height': height}
+        if is_up_to_date(output_video_path, [source, audio_file], settings):
+            skipped.append(output_video_path)
+        else:
+            stale.append((source, output_video_path, settings))
+    if skipped:
+        print(f"{len(skipped)} videos already up to date")
+    if not stale:
+        return {'succeeded': [], 'skipped': skipped, 'failed': []}
+
+    jobs = []
+    sources = [source for source, _, _ in stale]
+    with prepare_frames(sources, *frame_size(width, height, motion), fit='cover' if motion else 'contain') as prepared:
+        unprepared = []
+        for (source, output_video_path, settings), image_path in zip(stale, prepared):
+            if image_path is None:
+                unprepared.append(output_video_path)
+                continue
+            clip = clip_filter('0:v', 'v', duration, width, height, fps, settings['motion'])
+
             command = [
                 'ffmpeg',
                 '-y',
-                '-loop', '1',
                 '-i', image_path,
                 '-i', audio_file,
-                '-c:v', 'libx264',
-                '-tune', 'stillimage',
+                '-filter_complex', clip,
+                '-map', '[v]',
+                '-map', '1:a',
+                *encoder_args(preset, tune=None if motion else 'stillimage', threads=threads),
                 '-c:a', 'copy',
-                '-pix_fmt', 'yuv420p',
                 '-shortest',
                 output_video_path
             ]
-            
-            subprocess.run(command)
-            print(f"Created video for {image_file}")
+            jobs.append((output_video_path, [source, audio_file], command, settings))
+
+        summary = run_ffmpeg_jobs(jobs, workers=workers, threads_per_job=threads)
+    summary['skipped'].extend(skipped)
+    summary['failed'].extend(unprepared)
+    return summary
 
 async def main():
     # Get user input for the prompt
@@ -310,17 +794,13 @@ async def main():
             # Ask user whether to upload to Empowerverse
             a = input("Do you want to upload it to the Empowerverse app? (y/n): ")
             
-            for url in urls:
-                try:
-                    if a.lower() == 'y':
-                        await process_media_url(url)
-                    else:
-                        await process_post(url)
-                except Exception as e:
-                    print(f"Error processing {url}: {e}", file=sys.stderr)
-                finally:
-                    if os.path.exists('media'):
-                        shutil.rmtree('media')
+            # Every job works in its own directory, so all posts can be processed at once;
+            # the shared downloader caps how many hit Instagram concurrently
+            process = process_media_url if a.lower() == 'y' else process_post
+            results = await asyncio.gather(*(process(url) for url in urls), return_exceptions=True)
+            for url, result in zip(urls, results):
+                if isinstance(result, Exception):
+                    print(f"Error processing {url}: {result}", file=sys.stderr)
             
             # After processing all URLs, create videos if audio file exists
             if os.path.exists('audio.mp3'):
@@ -330,6 +810,11 @@ async def main():
             print(f"No posts found for #{hashtag}.")
     except Exception as e:
         print(f"Error: {e}")
+    finally:
+        if downloader:
+            await downloader.close()
+        if socialverse:
+            await socialverse.close()
 
 if __name__ == "__main__":
     asyncio.run(main())
\ No newline at end of file
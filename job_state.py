@@ -0,0 +1,105 @@
+import json
+import os
+import tempfile
+import threading
+from datetime import datetime
+
+# Default location of job state files, one <job_id>.json per job
+JOBS_DIR = '.jobs'
+
+
+class JobState:
+    """
+    Checkpoint store for one pipeline run.
+
+    Every completed stage (Gemini prompts, each image, each audio chunk, the
+    narration and the final render) records its output here. A run restarted
+    with the same job skips stages that already have an output, so a retry only
+    redoes the part that failed. State is rewritten atomically after each
+    stage, and stage updates are safe from worker threads.
+    """
+
+    def __init__(self, job_id, topic, output_dir, stages=None, status='running', error=None, root=JOBS_DIR):
+        self.job_id = job_id
+        self.topic = topic
+        self.output_dir = output_dir
+        self.stages = stages or {}
+        self.status = status
+        self.error = error
+        self.root = root
+        self._lock = threading.Lock()
+
+    @classmethod
+    def create(cls, topic, output_dir, job_id=None, root=JOBS_DIR):
+        """Start a new job and save its initial state."""
+        job_id = job_id or os.path.basename(os.path.normpath(output_dir))
+        job = cls(job_id, topic, output_dir, root=root)
+        job.save()
+        return job
+
+    @classmethod
+    def load(cls, job_id, root=JOBS_DIR):
+        """Load a saved job. Raises FileNotFoundError for unknown job ids."""
+        with open(os.path.join(root, f"{job_id}.json"), 'r', encoding='utf-8') as f:
+            data = json.load(f)
+        return cls(data['job_id'], data['topic'], data['output_dir'], data['stages'],
+                   data['status'], data.get('error'), root=root)
+
+    @staticmethod
+    def list_ids(root=JOBS_DIR, status=None):
+        """Return saved job ids, optionally only those with the given status."""
+        if not os.path.isdir(root):
+            return []
+        job_ids = sorted(name[:-len('.json')] for name in os.listdir(root) if name.endswith('.json'))
+        if status is None:
+            return job_ids
+        return [job_id for job_id in job_ids if JobState.load(job_id, root).status == status]
+
+    def get(self, stage):
+        """Return the recorded output of a stage, or None if it has not completed."""
+        with self._lock:
+            return self.stages.get(stage)
+
+    def get_file(self, stage):
+        """Return a stage's output path if the stage completed and the file still exists."""
+        path = self.get(stage)
+        return path if path and os.path.exists(path) else None
+
+    def complete(self, stage, output):
+        """Record a stage's output and persist the state."""
+        with self._lock:
+            self.stages[stage] = output
+            self._save()
+
+    def finish(self):
+        """Mark the whole job as completed."""
+        with self._lock:
+            self.status, self.error = 'completed', None
+            self._save()
+
+    def fail(self, error):
+        """Mark the job as failed so it can be resumed later."""
+        with self._lock:
+            self.status, self.error = 'failed', str(error)
+            self._save()
+
+    def save(self):
+        """Persist the state."""
+        with self._lock:
+            self._save()
+
+    def _save(self):
+        data = {
+            'job_id': self.job_id,
+            'topic': self.topic,
+            'output_dir': self.output_dir,
+            'status': self.status,
+            'error': self.error,
+            'updated_at': datetime.now().isoformat(timespec='seconds'),
+            'stages': self.stages,
+        }
+        os.makedirs(self.root, exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=self.root, suffix='.tmp')
+        with os.fdopen(fd, 'w', encoding='utf-8') as f:
+            json.dump(data, f, indent=4)
+        os.replace(tmp_path, os.path.join(self.root, f"{self.job_id}.json"))
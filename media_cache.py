@@ -0,0 +1,164 @@
+import hashlib
+import json
+import os
+import shutil
+import tempfile
+import threading
+from contextlib import contextmanager
+
+# Default cache location and size cap (2 GB)
+CACHE_DIR = '.media_cache'
+MAX_CACHE_BYTES = 2 * 1024 ** 3
+
+
+def cache_key(*parts):
+    """Hash the given parts (strings, numbers, dicts) into a stable hex key."""
+    encoded = json.dumps(parts, sort_keys=True, default=str).encode('utf-8')
+    return hashlib.sha256(encoded).hexdigest()
+
+
+class MediaCache:
+    """
+    Content-addressed on-disk cache with a size cap and LRU eviction.
+
+    Entries are stored as <root>/<key[:2]>/<key><suffix>. Every write goes to a
+    temporary file first and is renamed into place, so readers never see a
+    partial entry. A hit refreshes the entry's mtime, which is what eviction
+    orders by. Entries in use can be pinned, which keeps eviction from
+    removing them (pins only hold within this process).
+    """
+
+    def __init__(self, root=CACHE_DIR, max_bytes=MAX_CACHE_BYTES):
+        self.root = root
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self._size = None
+        self._pins = {}
+        os.makedirs(root, exist_ok=True)
+
+    def path(self, key, suffix=''):
+        """Return the path an entry is stored at, whether or not it exists."""
+        return os.path.join(self.root, key[:2], f"{key}{suffix}")
+
+    def get(self, key, suffix=''):
+        """Return the path of a cached entry, or None on a miss."""
+        path = self.path(key, suffix)
+        try:
+            os.utime(path)
+        except FileNotFoundError:
+            return None
+        return path
+
+    def get_text(self, key):
+        """Return a cached text entry, or None on a miss."""
+        path = self.get(key, '.txt')
+        if path is None:
+            return None
+        with open(path, 'r', encoding='utf-8') as f:
+            return f.read()
+
+    def put(self, key, data, suffix=''):
+        """Atomically store bytes under key and return the entry path."""
+        path = self.path(key, suffix)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), suffix='.tmp')
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                f.write(data)
+            os.replace(tmp_path, path)
+        except BaseException:
+            os.remove(tmp_path)
+            raise
+        self._account(len(data))
+        return path
+
+    def put_text(self, key, text):
+        """Atomically store a text entry and return its path."""
+        return self.put(key, text.encode('utf-8'), '.txt')
+
+    def put_file(self, key, source, suffix=''):
+        """Atomically copy a file into the cache under key and return the entry path."""
+        path = self.path(key, suffix)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), suffix='.tmp')
+        os.close(fd)
+        try:
+            shutil.copyfile(source, tmp_path)
+            os.replace(tmp_path, path)
+        except BaseException:
+            os.remove(tmp_path)
+            raise
+        self._account(os.path.getsize(path))
+        return path
+
+    def copy_to(self, key, destination, suffix=''):
+        """Copy a cached entry to destination. Returns False on a miss."""
+        path = self.get(key, suffix)
+        if path is None:
+            return False
+        shutil.copyfile(path, destination)
+        return True
+
+    @contextmanager
+    def pinned(self, paths):
+        """Keep the entries at paths (present or not yet written) from being evicted inside the block."""
+        with self._lock:
+            for path in paths:
+                self._pins[path] = self._pins.get(path, 0) + 1
+        try:
+            yield
+        finally:
+            with self._lock:
+                for path in paths:
+                    self._pins[path] -= 1
+                    if not self._pins[path]:
+                        del self._pins[path]
+
+    def _entries(self):
+        for dirpath, _, filenames in os.walk(self.root):
+            for filename in filenames:
+                if filename.endswith('.tmp'):
+                    continue
+                path = os.path.join(dirpath, filename)
+                try:
+                    stat = os.stat(path)
+                except FileNotFoundError:
+                    continue
+                yield path, stat.st_size, stat.st_mtime
+
+    def _account(self, added_bytes):
+        with self._lock:
+            if self._size is None:
+                self._size = sum(size for _, size, _ in self._entries())
+            else:
+                self._size += added_bytes
+            if self._size > self.max_bytes:
+                self._evict()
+
+    def _evict(self):
+        # Drop least recently used entries until the cache is back under its cap
+        entries = sorted(self._entries(), key=lambda entry: entry[2])
+        self._size = sum(size for _, size, _ in entries)
+        for path, size, _ in entries:
+            if self._size <= self.max_bytes:
+                break
+            if path in self._pins:
+                continue
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+            self._size -= size
+
+
+_shared = None
+_shared_lock = threading.Lock()
+
+
+def get_cache():
+    """Return the MediaCache on CACHE_DIR shared by every module, so they keep one size count and one set of pins."""
+    global _shared
+    with _shared_lock:
+        if _shared is None:
+            _shared = MediaCache()
+        return _shared
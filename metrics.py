@@ -0,0 +1,157 @@
+import asyncio
+import contextvars
+import functools
+import json
+import math
+import os
+import sys
+import threading
+import time
+from contextlib import contextmanager
+from datetime import datetime
+
+# JSON-lines file every traced call is appended to
+METRICS_FILE = os.getenv('METRICS_FILE', 'metrics.jsonl')
+
+_write_lock = threading.Lock()
+_current_span = contextvars.ContextVar('current_span', default=None)
+
+
+class Span:
+    """
+    Measurements for one traced call. Code running inside the call adds
+    transferred bytes, retries and API units (characters, tokens) through
+    current_span().
+    """
+
+    def __init__(self, stage, attrs=None):
+        self.stage = stage
+        self.attrs = dict(attrs or {})
+        self.bytes = 0
+        self.retries = 0
+        self.units = {}
+
+    def add_bytes(self, count):
+        self.bytes += count
+
+    def add_retry(self):
+        self.retries += 1
+
+    def add_units(self, name, count):
+        """Count API usage, e.g. add_units('characters', len(text)) or add_units('tokens', n)."""
+        self.units[name] = self.units.get(name, 0) + count
+
+    def set(self, **attrs):
+        self.attrs.update(attrs)
+
+
+def current_span():
+    """Return the span of the innermost traced call, or None outside of one."""
+    return _current_span.get()
+
+
+def record(entry, path=None):
+    """Append one metrics entry to the JSON-lines file."""
+    line = json.dumps(entry, ensure_ascii=False, default=str)
+    with _write_lock:
+        with open(path or METRICS_FILE, 'a', encoding='utf-8') as f:
+            f.write(line + "\n")
+
+
+@contextmanager
+def trace(stage, **attrs):
+    """Time a block of code as `stage` and record it, with whatever the block added to the span."""
+    span = Span(stage, attrs)
+    token = _current_span.set(span)
+    started = time.perf_counter()
+    error = None
+    try:
+        yield span
+    except BaseException as e:
+        error = f"{type(e).__name__}: {e}"
+        raise
+    finally:
+        _current_span.reset(token)
+        record({
+            "timestamp": datetime.now().isoformat(timespec='milliseconds'),
+            "stage": stage,
+            "wall_time": round(time.perf_counter() - started, 4),
+            "bytes": span.bytes,
+            "retries": span.retries,
+            "units": span.units,
+            "ok": error is None,
+            "error": error,
+            **span.attrs,
+        })
+
+
+def traced(stage):
+    """Decorator that traces every call of a sync or async function as `stage`."""
+    def decorator(func):
+        if asyncio.iscoroutinefunction(func):
+            @functools.wraps(func)
+            async def async_wrapper(*args, **kwargs):
+                with trace(stage):
+                    return await func(*args, **kwargs)
+            return async_wrapper
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            with trace(stage):
+                return func(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+def percentile(values, fraction):
+    """Nearest-rank percentile of a list of numbers."""
+    ordered = sorted(values)
+    # Rank ceil(fraction * n); rounding first keeps float noise (0.55 * 100 = 55.000000000000007) off the next rank
+    rank = math.ceil(round(fraction * len(ordered), 9))
+    index = max(0, min(len(ordered) - 1, rank - 1))
+    return ordered[index]
+
+
+def summarize(path=None):
+    """Aggregate a metrics file into per-stage counts, p50/p95 wall time, bytes, retries and units."""
+    stages = {}
+    with open(path or METRICS_FILE, 'r', encoding='utf-8') as f:
+        for line in f:
+            if not line.strip():
+                continue
+            entry = json.loads(line)
+            stage = stages.setdefault(entry["stage"], {
+                "count": 0, "errors": 0, "wall_times": [], "bytes": 0, "retries": 0, "units": {}
+            })
+            stage["count"] += 1
+            stage["errors"] += 0 if entry["ok"] else 1
+            stage["wall_times"].append(entry["wall_time"])
+            stage["bytes"] += entry["bytes"]
+            stage["retries"] += entry["retries"]
+            for name, count in entry["units"].items():
+                stage["units"][name] = stage["units"].get(name, 0) + count
+
+    summary = {}
+    for name, stage in stages.items():
+        wall_times = stage.pop("wall_times")
+        summary[name] = {
+            **stage,
+            "total_time": round(sum(wall_times), 3),
+            "p50": percentile(wall_times, 0.50),
+            "p95": percentile(wall_times, 0.95),
+        }
+    return summary
+
+
+def print_report(path=None):
+    """Print the per-stage summary, slowest stage (by total time) first."""
+    summary = summarize(path)
+    print(f"{'stage':<24}{'calls':>7}{'errors':>8}{'p50 s':>9}{'p95 s':>9}{'total s':>10}{'MB':>9}{'retries':>9}  units")
+    for name, stage in sorted(summary.items(), key=lambda item: item[1]["total_time"], reverse=True):
+        units = ", ".join(f"{unit}={count}" for unit, count in stage["units"].items())
+        print(f"{name:<24}{stage['count']:>7}{stage['errors']:>8}{stage['p50']:>9.2f}{stage['p95']:>9.2f}"
+              f"{stage['total_time']:>10.1f}{stage['bytes'] / 1e6:>9.2f}{stage['retries']:>9}  {units}")
+
+
+if __name__ == "__main__":
+    print_report(sys.argv[1] if len(sys.argv) > 1 else None)
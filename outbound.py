@@ -0,0 +1,279 @@
+import asyncio
+import random
+import threading
+import time
+from contextlib import asynccontextmanager
+from datetime import datetime, timezone
+from email.utils import parsedate_to_datetime
+from urllib.parse import urlsplit
+
+import aiohttp
+import requests
+from google.api_core import exceptions as google_exceptions
+
+from metrics import current_span
+
+# Starting request rate (requests/second) and burst per host. On a 429 the rate is halved, and every success
+# adds RATE_INCREASE back, so each host settles just under the rate the provider accepts
+DEFAULT_RATE = 20.0
+BURST = 10
+MIN_RATE = 0.5
+MAX_RATE = 100.0
+RATE_DECREASE = 0.5
+RATE_INCREASE = 1.0
+
+# Starting rates for hosts known to be stricter than DEFAULT_RATE
+HOST_RATES = {
+    'api.elevenlabs.io': 2.0,
+    'www.instagram.com': 1.0,
+}
+
+# Host of the Gemini API, which is called through its SDK (see call()) rather than by URL, and the SDK errors
+# that mean it is throttling (429, including ResourceExhausted) or failing (5xx)
+GEMINI_HOST = 'generativelanguage.googleapis.com'
+GEMINI_THROTTLE_ERRORS = (google_exceptions.TooManyRequests,)
+GEMINI_RETRY_ERRORS = (google_exceptions.InternalServerError, google_exceptions.BadGateway,
+                       google_exceptions.ServiceUnavailable, google_exceptions.GatewayTimeout)
+
+# Retries per request, and the base and cap (seconds) of the jittered exponential backoff between them
+MAX_RETRIES = 3
+BACKOFF_BASE = 1.0
+BACKOFF_CAP = 30.0
+
+# HTTP statuses worth retrying; everything else is returned to the caller as is
+RETRY_STATUSES = (429, 500, 502, 503, 504)
+
+# Circuit breaker: consecutive failures (5xx, connection errors) that open a host's circuit, and how long
+# requests to it are shed before one trial request is let through
+FAILURE_THRESHOLD = 5
+RESET_TIMEOUT = 30.0
+
+
+class CircuitOpenError(Exception):
+    """Raised instead of sending a request while the host's circuit is open."""
+
+
+def parse_retry_after(value):
+    """Return a Retry-After header (seconds or an HTTP date) as seconds to wait, or None."""
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        return max(0.0, (parsedate_to_datetime(value) - datetime.now(timezone.utc)).total_seconds())
+    except (TypeError, ValueError):
+        return None
+
+
+def backoff_delay(attempt, base=BACKOFF_BASE):
+    """Exponential backoff with jitter, so callers that failed together don't retry together."""
+    ceiling = min(base * 2 ** attempt, max(BACKOFF_CAP, base))
+    return ceiling / 2 + random.uniform(0, ceiling / 2)
+
+
+class HostLimiter:
+    """
+    Adaptive token bucket and circuit breaker for one host.
+
+    reserve() hands out send times at the current rate, which is cut on every
+    429 and slowly raised again on success; a Retry-After holds every caller
+    until it has passed. After FAILURE_THRESHOLD consecutive failures the
+    circuit opens and requests fail fast with CircuitOpenError for
+    RESET_TIMEOUT seconds, after which a single trial request decides whether
+    it closes again. Thread-safe, so sync and async callers share one limiter.
+    """
+
+    def __init__(self, host, rate=DEFAULT_RATE, burst=BURST):
+        self.host = host
+        self.rate = rate
+        self.burst = burst
+        self.tokens = float(burst)
+        self.updated = time.monotonic()
+        self.blocked_until = 0.0
+        self.failures = 0
+        self.opened_at = None
+        self._lock = threading.Lock()
+
+    def reserve(self):
+        """Take a token and return how many seconds to wait before sending. Raises CircuitOpenError."""
+        with self._lock:
+            now = time.monotonic()
+            if self.opened_at is not None:
+                if now - self.opened_at < RESET_TIMEOUT:
+                    raise CircuitOpenError(f"Circuit open for {self.host}, shedding request")
+                # Let this request through as the trial; the rest are shed for another period unless it succeeds
+                self.opened_at = now
+            self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+            self.updated = now
+            self.tokens -= 1
+            return max(0.0, -self.tokens / self.rate, self.blocked_until - now)
+
+    def record_success(self):
+        with self._lock:
+            if self.opened_at is not None:
+                print(f"Circuit closed for {self.host}")
+            self.failures, self.opened_at = 0, None
+            self.rate = min(MAX_RATE, self.rate + RATE_INCREASE)
+
+    def record_throttle(self, retry_after=None):
+        """The host answered 429: slow down, and hold all callers for Retry-After if it was given."""
+        with self._lock:
+            self.rate = max(MIN_RATE, self.rate * RATE_DECREASE)
+            if retry_after is not None:
+                self.blocked_until = max(self.blocked_until, time.monotonic() + retry_after)
+            if self.opened_at is not None:
+                # A throttled trial keeps the circuit open for another period
+                self.opened_at = time.monotonic()
+
+    def record_failure(self):
+        with self._lock:
+            self.failures += 1
+            if self.opened_at is not None or self.failures >= FAILURE_THRESHOLD:
+                if self.opened_at is None:
+                    print(f"Circuit opened for {self.host} after {self.failures} consecutive failures")
+                self.opened_at = time.monotonic()
+
+
+limiters = {}
+_limiters_lock = threading.Lock()
+
+
+def get_limiter(url_or_host):
+    """Return the shared HostLimiter for a URL's host (or a bare host name)."""
+    host = urlsplit(url_or_host).netloc or url_or_host
+    with _limiters_lock:
+        if host not in limiters:
+            limiters[host] = HostLimiter(host, HOST_RATES.get(host, DEFAULT_RATE))
+        return limiters[host]
+
+
+def _count_retry():
+    span = current_span()
+    if span:
+        span.add_retry()
+
+
+def request(session, method, url, retries=MAX_RETRIES, retry_statuses=RETRY_STATUSES, backoff=BACKOFF_BASE,
+            **kwargs):
+    """
+    Send a request with a requests session through the host's limiter.
+
+    Connection errors and retry_statuses are retried with jittered backoff
+    (or after Retry-After on a 429). Returns the last response, whatever its
+    status; raises the last connection error, or CircuitOpenError while the
+    host is shedding load.
+    """
+    limiter = get_limiter(url)
+    for attempt in range(retries + 1):
+        if attempt:
+            _count_retry()
+        time.sleep(limiter.reserve())
+        retry_after = None
+        try:
+            response = session.request(method, url, **kwargs)
+        except requests.RequestException as e:
+            limiter.record_failure()
+            if attempt == retries:
+                raise
+            print(f"Request to {limiter.host} failed ({e}), retrying")
+        else:
+            if response.status_code not in retry_statuses:
+                # 4xx answers mean the request was wrong, not that the provider is degraded
+                limiter.record_success()
+                return response
+            if response.status_code == 429:
+                retry_after = parse_retry_after(response.headers.get('Retry-After'))
+                limiter.record_throttle(retry_after)
+            else:
+                limiter.record_failure()
+            if attempt == retries:
+                return response
+            print(f"{limiter.host} answered {response.status_code}, retrying")
+            response.close()
+        # After a Retry-After the limiter itself holds the next reserve() until the host is ready
+        if retry_after is None:
+            time.sleep(backoff_delay(attempt, backoff))
+
+
+async def _asend(session, method, url, retries, retry_statuses, backoff, kwargs):
+    limiter = get_limiter(url)
+    data = kwargs.pop('data', None)
+    for attempt in range(retries + 1):
+        if attempt:
+            _count_retry()
+        await asyncio.sleep(limiter.reserve())
+        retry_after = None
+        try:
+            # A callable body (e.g. one that returns a fresh async generator) is rebuilt for every attempt
+            response = await session.request(method, url, data=data() if callable(data) else data, **kwargs)
+        except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+            limiter.record_failure()
+            if attempt == retries:
+                raise
+            print(f"Request to {limiter.host} failed ({e!r}), retrying")
+        else:
+            if response.status not in retry_statuses:
+                limiter.record_success()
+                return response
+            if response.status == 429:
+                retry_after = parse_retry_after(response.headers.get('Retry-After'))
+                limiter.record_throttle(retry_after)
+            else:
+                limiter.record_failure()
+            if attempt == retries:
+                return response
+            print(f"{limiter.host} answered {response.status}, retrying")
+            response.release()
+        if retry_after is None:
+            await asyncio.sleep(backoff_delay(attempt, backoff))
+
+
+@asynccontextmanager
+async def arequest(session, method, url, retries=MAX_RETRIES, retry_statuses=RETRY_STATUSES, backoff=BACKOFF_BASE,
+                   **kwargs):
+    """
+    aiohttp counterpart of request(), used as `async with arequest(session, 'GET', url) as response:`.
+    Pass data as a zero-argument callable for bodies that can only be read once.
+    """
+    response = await _asend(session, method, url, retries, retry_statuses, backoff, kwargs)
+    try:
+        yield response
+    finally:
+        response.release()
+
+
+def call(host, func, *args, retries=MAX_RETRIES, throttle_on=(), retry_on=(), give_up_on=(), backoff=BACKOFF_BASE,
+         **kwargs):
+    """
+    Run a blocking SDK call (Gemini, Instaloader) against host through its limiter.
+
+    Exceptions in throttle_on count as 429s and those in retry_on as provider
+    failures; both are retried with jittered backoff. Anything else, and
+    anything in give_up_on (e.g. a not-found subclass of a retried error), is
+    raised straight away.
+    """
+    limiter = get_limiter(host)
+    for attempt in range(retries + 1):
+        if attempt:
+            _count_retry()
+        time.sleep(limiter.reserve())
+        try:
+            result = func(*args, **kwargs)
+        except give_up_on:
+            raise
+        except throttle_on as e:
+            limiter.record_throttle()
+            if attempt == retries:
+                raise
+            print(f"Rate limited by {host} ({type(e).__name__}), backing off")
+        except retry_on as e:
+            limiter.record_failure()
+            if attempt == retries:
+                raise
+            print(f"Call to {host} failed ({type(e).__name__}), retrying")
+        else:
+            limiter.record_success()
+            return result
+        time.sleep(backoff_delay(attempt, backoff))
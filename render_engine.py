@@ -0,0 +1,157 @@
+import math
+import os
+
+# Named speed/quality trade-offs for libx264 on CPU-only render nodes
+RENDER_PRESETS = {
+    'draft': {'x264_preset': 'ultrafast', 'crf': 28, 'fps': 15},
+    'fast': {'x264_preset': 'veryfast', 'crf': 23, 'fps': 25},
+    'balanced': {'x264_preset': 'medium', 'crf': 21, 'fps': 30},
+    'quality': {'x264_preset': 'slow', 'crf': 18, 'fps': 30},
+}
+DEFAULT_PRESET = 'fast'
+
+# Pan/zoom moves, cycled through the frames of an animated render
+MOTIONS = ('zoom_in', 'pan_right', 'zoom_out', 'pan_left')
+
+# How far past the output size animated frames are pre-scaled; this is the room pan/zoom has to move in
+MOTION_MARGIN = 1.15
+
+# Default crossfade length between consecutive frames, in seconds
+TRANSITION_DURATION = 0.5
+
+# Output formats (width, height) one render can produce together: landscape feeds, square posts and reels
+OUTPUT_FORMATS = {
+    'landscape': (1280, 720),
+    'square': (720, 720),
+    'vertical': (720, 1280),
+}
+
+
+def get_preset(name=DEFAULT_PRESET):
+    """Return the settings of a named render preset."""
+    if name not in RENDER_PRESETS:
+        raise ValueError(f"Unknown render preset '{name}', expected one of: {', '.join(RENDER_PRESETS)}")
+    return RENDER_PRESETS[name]
+
+
+def encoder_args(preset=DEFAULT_PRESET, tune=None, threads=None):
+    """FFmpeg output arguments for libx264 with the given preset's speed, quality and frame rate."""
+    settings = get_preset(preset)
+    args = ['-c:v', 'libx264', '-preset', settings['x264_preset'], '-crf', str(settings['crf'])]
+    if tune:
+        args += ['-tune', tune]
+    if threads:
+        args += ['-threads', str(threads)]
+    return args + ['-r', str(settings['fps']), '-pix_fmt', 'yuv420p']
+
+
+def get_format(name):
+    """Return the (width, height) of a named output format."""
+    if name not in OUTPUT_FORMATS:
+        raise ValueError(f"Unknown output format '{name}', expected one of: {', '.join(OUTPUT_FORMATS)}")
+    return OUTPUT_FORMATS[name]
+
+
+def variant_path(output_path, name):
+    """Path of one format's variant of output_path, e.g. video.mp4 -> video_vertical.mp4."""
+    stem, ext = os.path.splitext(output_path)
+    return f"{stem}_{name}{ext or '.mp4'}"
+
+
+def frame_size(width, height, motion=False):
+    """Size stills are scaled to before entering the graph: the output size, plus MOTION_MARGIN when animated."""
+    scale = MOTION_MARGIN if motion else 1
+    return int(width * scale) // 2 * 2, int(height * scale) // 2 * 2
+
+
+def clip_filter(source, label, duration, width, height, fps, motion=None, fit='contain'):
+    """
+    Filter chain turning one still image into a width x height clip of the given duration.
+
+    The image is decoded and scaled once, then repeated with the loop filter,
+    instead of being re-read and re-scaled for every output frame as with
+    `-loop 1`. Without a motion the image is fitted inside the frame (or, with
+    fit='cover', cropped to fill it); with one it is pre-scaled to cover
+    MOTION_MARGIN times the frame and animated with a
+    moving crop (pans) or zoompan on the small pre-scaled copy (zooms). Inputs
+    already at frame_size (see image_prep) pass through the scale untouched.
+    """
+    frames = max(1, math.ceil(duration * fps))
+    if motion is None:
+        if fit == 'cover':
+            scale = f"scale={width}:{height}:force_original_aspect_ratio=increase,crop={width}:{height}"
+        else:
+            scale = f"scale={width}:{height}:force_original_aspect_ratio=decrease,pad={width}:{height}:(ow-iw)/2:(oh-ih)/2"
+        move = f"loop=loop={frames - 1}:size=1,setpts=N/({fps}*TB)"
+    else:
+        scaled_w, scaled_h = frame_size(width, height, motion=True)
+        scale = f"scale={scaled_w}:{scaled_h}:force_original_aspect_ratio=increase,crop={scaled_w}:{scaled_h}"
+        progress = f"n/{max(1, frames - 1)}"
+        if motion in ('zoom_in', 'zoom_out'):
+            growth = f"{MOTION_MARGIN - 1:.4f}*on/{frames}"
+            zoom = f"1+{growth}" if motion == 'zoom_in' else f"{MOTION_MARGIN:.4f}-{growth}"
+            move = (f"zoompan=z='{zoom}':x='(iw-iw/zoom)/2':y='(ih-ih/zoom)/2'"
+                    f":d={frames}:s={width}x{height}:fps={fps}")
+        elif motion in ('pan_right', 'pan_left'):
+            x = f"(iw-ow)*{progress}" if motion == 'pan_right' else f"(iw-ow)*(1-{progress})"
+            move = f"loop=loop={frames - 1}:size=1,setpts=N/({fps}*TB),crop={width}:{height}:x='{x}':y='(ih-oh)/2'"
+        else:
+            raise ValueError(f"Unknown motion '{motion}', expected one of: {', '.join(MOTIONS)}")
+    return f"[{source}]{scale},setsar=1,{move},format=yuv420p,fps={fps}[{label}]"
+
+
+def slideshow_filter(durations, width, height, fps, motion=False, transition=None,
+                     transition_duration=TRANSITION_DURATION, sources=None, label='v', fit='contain'):
+    """
+    Filter graph joining one still image per duration into a single [label] stream.
+
+    The images are inputs 0..n-1 unless other source pads are given. Frames
+    are animated with MOTIONS in turn when motion is set. With a transition
+    (any FFmpeg xfade name, e.g. 'fade' or 'slideleft'), each clip but the
+    last is extended by the overlap and crossfaded into the next, so the
+    total length still equals sum(durations).
+    """
+    count = len(durations)
+    sources = sources or [f"{i}:v" for i in range(count)]
+    overlap = min(transition_duration, min(durations) / 2) if transition and count > 1 else 0
+    filters = []
+    for i, duration in enumerate(durations):
+        length = duration + (overlap if i < count - 1 else 0)
+        filters.append(clip_filter(sources[i], f"{label}c{i}", length, width, height, fps,
+                                   MOTIONS[i % len(MOTIONS)] if motion else None, fit))
+
+    if count == 1:
+        filters.append(f"[{label}c0]null[{label}]")
+    elif overlap:
+        previous, offset = f"{label}c0", 0.0
+        for i in range(1, count):
+            offset += durations[i - 1]
+            output = label if i == count - 1 else f"{label}x{i}"
+            filters.append(f"[{previous}][{label}c{i}]xfade=transition={transition}"
+                           f":duration={overlap:.3f}:offset={offset:.3f}[{output}]")
+            previous = output
+    else:
+        filters.append("".join(f"[{label}c{i}]" for i in range(count)) + f"concat=n={count}:v=1:a=0[{label}]")
+    return ";".join(filters)
+
+
+def formats_filter(durations, formats, fps, motion=False, transition=None):
+    """
+    Filter graph rendering the same slideshow in several output formats at once.
+
+    Each image input is decoded once and split per format; every branch is
+    cropped and scaled to its format's size a single time and then animated at
+    that size, so no format pays for per-frame rescaling of a shared master.
+    The output pads are [o0], [o1], ... in the order of formats.
+    """
+    count = len(durations)
+    filters = []
+    if len(formats) > 1:
+        for i in range(count):
+            filters.append(f"[{i}:v]split={len(formats)}" + "".join(f"[s{i}_{j}]" for j in range(len(formats))))
+    for j, name in enumerate(formats):
+        width, height = get_format(name)
+        sources = [f"s{i}_{j}" for i in range(count)] if len(formats) > 1 else None
+        filters.append(slideshow_filter(durations, width, height, fps, motion, transition,
+                                        sources=sources, label=f"o{j}", fit='cover'))
+    return ";".join(filters)
@@ -0,0 +1,257 @@
+import argparse
+import asyncio
+import itertools
+import os
+import sys
+from collections import deque
+from dataclasses import asdict, dataclass, field
+from datetime import datetime
+
+from aiohttp import web
+
+from batch import STAGE_LIMITS, StagePipeline, topic_directory
+from content import NUM_SCENES
+from job_state import JobState
+from metrics import trace
+from render_engine import DEFAULT_PRESET, OUTPUT_FORMATS, RENDER_PRESETS
+
+# Address the job API listens on
+SERVICE_HOST = '127.0.0.1'
+SERVICE_PORT = 8080
+
+# Jobs run at once (topic jobs are further bounded by the per-stage limits) and hashtag pages harvested at once
+SERVICE_WORKERS = 4
+HARVEST_CONCURRENCY = 2
+
+JOB_TYPES = ('topic', 'hashtag')
+
+# Finished (completed or failed) jobs kept for GET /jobs; older ones are dropped so a long-running service stays bounded
+JOB_RETENTION = 1000
+
+
+def now():
+    return datetime.now().isoformat(timespec='seconds')
+
+
+@dataclass
+class ServiceJob:
+    """A submitted topic or hashtag job, its status (queued, running, completed, failed) and outcome."""
+    id: str
+    type: str
+    params: dict
+    status: str = 'queued'
+    result: object = None
+    error: str = None
+    created: str = field(default_factory=now)
+    started: str = None
+    finished: str = None
+
+
+class WorkerService:
+    """
+    Long-running worker that takes topic and hashtag jobs from a queue.
+
+    Everything that is slow to set up is created once and reused by every job:
+    the StagePipeline (with content.py's pooled HTTP session and Gemini model),
+    one headless browser for hashtag pages, and insta_scrapper's shared
+    Instagram downloader, Socialverse client and hashtag model. Jobs only pay
+    for their own API calls and renders. insta_scrapper is imported by the
+    first hashtag job, so a topic-only service does not need its credentials.
+    """
+
+    def __init__(self, workers=SERVICE_WORKERS, limits=None, num_scenes=NUM_SCENES, render_options=None, formats=None):
+        self.workers = workers
+        self.pipeline = StagePipeline(limits, num_scenes, render_options=render_options, formats=formats)
+        self.queue = asyncio.Queue()
+        self.jobs = {}
+        self._finished = deque()
+        self.run_id = datetime.now().strftime("%Y%m%d_%H%M%S")
+        self._counter = itertools.count(1)
+        self._tasks = []
+        self._harvester = None
+        self._harvester_lock = asyncio.Lock()
+        self._harvest_semaphore = asyncio.Semaphore(HARVEST_CONCURRENCY)
+
+    def submit(self, job_type, params):
+        """Validate and queue a job. Raises ValueError for malformed jobs."""
+        for name in ('topic', 'hashtag', 'prompt', 'video_format', 'audio_file'):
+            if params.get(name) is not None and not isinstance(params[name], str):
+                raise ValueError(f"'{name}' must be a string.")
+        limit = params.get('limit')
+        if limit is not None and (isinstance(limit, bool) or not isinstance(limit, int) or limit < 1):
+            raise ValueError("'limit' must be a positive integer.")
+
+        if job_type == 'topic':
+            if not (params.get('topic') or '').strip():
+                raise ValueError("A topic job needs a non-empty 'topic'.")
+            label = params['topic']
+        elif job_type == 'hashtag':
+            if not params.get('hashtag') and not params.get('prompt'):
+                raise ValueError("A hashtag job needs a 'hashtag' or a 'prompt' to generate one from.")
+            label = params.get('hashtag') or params['prompt']
+        else:
+            raise ValueError(f"Unknown job type {job_type!r}, expected one of: {', '.join(JOB_TYPES)}")
+
+        # Same naming as batch.py, so a topic job's id is also its JobState id and output directory name
+        output_dir = topic_directory(self.run_id, next(self._counter), label)
+        job = ServiceJob(os.path.basename(output_dir), job_type, {**params, 'output_dir': output_dir})
+        self.jobs[job.id] = job
+        self.queue.put_nowait(job)
+        return job
+
+    async def start(self):
+        self._tasks = [asyncio.create_task(self._worker()) for _ in range(self.workers)]
+        print(f"Worker service started with {self.workers} workers")
+
+    async def close(self):
+        """Stop the workers and release the browser and connection pools."""
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        if self._harvester:
+            await self._harvester.close()
+        insta_scrapper = sys.modules.get('insta_scrapper')
+        if insta_scrapper is None:
+            return
+        if insta_scrapper.downloader:
+            await insta_scrapper.downloader.close()
+        if insta_scrapper.socialverse:
+            await insta_scrapper.socialverse.close()
+
+    async def get_harvester(self):
+        """Return the shared HashtagHarvester, launching the browser on first use."""
+        import insta_scrapper
+        async with self._harvester_lock:
+            if self._harvester is None:
+                harvester = insta_scrapper.HashtagHarvester()
+                await harvester.start()
+                self._harvester = harvester
+        return self._harvester
+
+    async def run_topic(self, job):
+        state = JobState.create(job.params['topic'].strip(), job.params['output_dir'], job_id=job.id)
+        result = await self.pipeline.process_job(state)
+        if result['error']:
+            raise RuntimeError(result['error'])
+        return result
+
+    async def run_hashtag(self, job):
+        import insta_scrapper
+        params = job.params
+        hashtag = params.get('hashtag') or await asyncio.to_thread(
+            insta_scrapper.generate_hashtag_from_prompt, params['prompt']
+        )
+        hashtag = hashtag.replace('#', '').strip()
+        harvester = await self.get_harvester()
+        async with self._harvest_semaphore:
+            urls = await harvester.harvest(hashtag, params.get('limit', insta_scrapper.HARVEST_LIMIT))
+
+        if params.get('upload'):
+            tasks = [insta_scrapper.process_media_url(url, params.get('video_format'), params.get('audio_file'))
+                     for url in urls]
+        else:
+            tasks = [insta_scrapper.process_post(url) for url in urls]
+        results = await asyncio.gather(*tasks, return_exceptions=True)
+        errors = {url: str(result) for url, result in zip(urls, results) if isinstance(result, Exception)}
+        return {'hashtag': hashtag, 'urls': urls, 'errors': errors}
+
+    async def _worker(self):
+        runners = {'topic': self.run_topic, 'hashtag': self.run_hashtag}
+        while True:
+            job = await self.queue.get()
+            job.status, job.started = 'running', now()
+            try:
+                with trace('service_job', type=job.type, job_id=job.id):
+                    job.result = await runners[job.type](job)
+                job.status = 'completed'
+            except Exception as e:
+                job.status, job.error = 'failed', str(e)
+                print(f"Job {job.id} failed: {e}", file=sys.stderr)
+            finally:
+                job.finished = now()
+                self._forget_old_jobs(job)
+                self.queue.task_done()
+
+    def _forget_old_jobs(self, job):
+        self._finished.append(job.id)
+        while len(self._finished) > JOB_RETENTION:
+            self.jobs.pop(self._finished.popleft(), None)
+
+
+def create_app(service):
+    """
+    The job API:
+
+        POST /jobs        {"type": "topic", "topic": "..."} or
+                          {"type": "hashtag", "hashtag": "..." | "prompt": "...", "limit": 20,
+                           "upload": false, "video_format": "vertical", "audio_file": "audio.mp3"}
+        GET  /jobs        all jobs, optionally ?status=queued|running|completed|failed
+        GET  /jobs/{id}   one job's status and result
+    """
+    async def post_job(request):
+        try:
+            body = await request.json()
+        except ValueError:
+            return web.json_response({'error': "Request body must be a JSON object."}, status=400)
+        if not isinstance(body, dict):
+            return web.json_response({'error': "Request body must be a JSON object."}, status=400)
+        try:
+            job = service.submit(body.pop('type', None), body)
+        except ValueError as e:
+            return web.json_response({'error': str(e)}, status=400)
+        return web.json_response(asdict(job), status=202, headers={'Location': f"/jobs/{job.id}"})
+
+    async def list_jobs(request):
+        status = request.query.get('status')
+        jobs = [asdict(job) for job in service.jobs.values() if status is None or job.status == status]
+        return web.json_response({'jobs': jobs, 'queued': service.queue.qsize()})
+
+    async def get_job(request):
+        job = service.jobs.get(request.match_info['job_id'])
+        if job is None:
+            return web.json_response({'error': "Unknown job id."}, status=404)
+        return web.json_response(asdict(job))
+
+    async def on_startup(app):
+        await service.start()
+
+    async def on_cleanup(app):
+        await service.close()
+
+    app = web.Application()
+    app.add_routes([
+        web.post('/jobs', post_job),
+        web.get('/jobs', list_jobs),
+        web.get('/jobs/{job_id}', get_job),
+    ])
+    app.on_startup.append(on_startup)
+    app.on_cleanup.append(on_cleanup)
+    return app
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Run the topic and hashtag pipelines as a long-running job service.")
+    parser.add_argument('--host', default=SERVICE_HOST, help=f"address to listen on (default: {SERVICE_HOST})")
+    parser.add_argument('--port', type=int, default=SERVICE_PORT, help=f"port to listen on (default: {SERVICE_PORT})")
+    parser.add_argument('--workers', type=int, default=SERVICE_WORKERS,
+                        help=f"jobs run at once (default: {SERVICE_WORKERS})")
+    parser.add_argument('--scenes', type=int, default=NUM_SCENES, help=f"scenes per video (default: {NUM_SCENES})")
+    parser.add_argument('--preset', choices=RENDER_PRESETS, default=DEFAULT_PRESET,
+                        help=f"render speed/quality preset (default: {DEFAULT_PRESET})")
+    parser.add_argument('--motion', action='store_true', help="animate frames with Ken Burns pan and zoom")
+    parser.add_argument('--transition', metavar='XFADE', help="crossfade frames with an FFmpeg xfade transition, e.g. fade")
+    parser.add_argument('--formats', nargs='+', choices=OUTPUT_FORMATS,
+                        help="render these output formats together in one pass, e.g. vertical square landscape")
+    for stage, limit in STAGE_LIMITS.items():
+        parser.add_argument(f'--{stage}-concurrency', type=int, default=limit,
+                            help=f"topics allowed in the {stage} stage at once (default: {limit})")
+    args = parser.parse_args()
+
+    limits = {stage: getattr(args, f'{stage}_concurrency') for stage in STAGE_LIMITS}
+    render_options = {'preset': args.preset, 'motion': args.motion, 'transition': args.transition}
+    service = WorkerService(args.workers, limits, args.scenes, render_options, args.formats)
+    web.run_app(create_app(service), host=args.host, port=args.port)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,63 +1,324 @@
-import subprocess
+import json
 import os
+import subprocess
+import threading
+
+from ffmpeg_utils import probe_duration
+from image_prep import prepare_frames
+from metrics import current_span, traced
+from render_engine import (
+    DEFAULT_PRESET, OUTPUT_FORMATS, encoder_args, formats_filter, frame_size, get_format, get_preset,
+    slideshow_filter, variant_path
+)
 
-# Define the directory containing the images and the audio file
-image_dir = 'local_media'  # Ensure this is the correct directory
-audio_file = 'local_media\output_audio_1.mp3'
+# Default inputs and output used when run as a script
+manifest_file = 'local_media/storyline.json'
 output_video_path = 'output_video/slideshow_video.mp4'
 
-# Check if the image directory and audio file exist
-if not os.path.exists(image_dir):
-    raise FileNotFoundError(f"Image directory '{image_dir}' not found.")
-if not os.path.exists(audio_file):
-    raise FileNotFoundError(f"Audio file '{audio_file}' not found.")
-
-# Create the output directory if it doesn't exist
-os.makedirs('output_video', exist_ok=True)
-
-# Generate a text file with the list of images and their durations
-image_list_path = 'image_list.txt'
-with open(image_list_path, 'w') as f:
-    for image_file in sorted(os.listdir(image_dir)):
-        if image_file.endswith(('.jpg', '.jpeg', '.png')):
-            image_path = os.path.normpath(os.path.join(image_dir, image_file))
-            f.write(f"file '{image_path.replace(os.sep, '/')}'\n")
-            f.write("duration 4.5\n")  # Set each image duration to 2 seconds
-
-# Add the last image without a duration to avoid FFmpeg errors
-if os.path.exists(image_list_path):
-    with open(image_list_path, 'a') as f:
-        last_image = sorted(os.listdir(image_dir))[-1]
-        last_image_path = os.path.normpath(os.path.join(image_dir, last_image))
-        f.write(f"file '{last_image_path.replace(os.sep, '/')}'\n")
-
-# Construct the FFmpeg command to create the video
-command = [
-    'ffmpeg',
-    '-y',
-    '-f', 'concat',
-    '-safe', '0',
-    '-i', image_list_path,
-    '-i', audio_file,
-    '-c:v', 'libx264',
-    '-tune', 'stillimage',
-    '-c:a', 'copy',  # Copy the audio without re-encoding
-    '-pix_fmt', 'yuv420p',
-    '-t', '21',  # Explicitly set video duration to match audio (15 seconds)
-    output_video_path
-]
-
-print(f"Running FFmpeg command: {' '.join(command)}")
-
-# Execute the command
-result = subprocess.run(command, capture_output=True, text=True)
-
-# Output FFmpeg logs if the process fails
-if result.returncode != 0:
-    print("FFmpeg Error:")
-    print(result.stderr)
-else:
-    print(f"Slideshow video with audio created successfully at {output_video_path}")
-
-# Clean up the temporary image list file
-os.remove(image_list_path)
+# How long a streamed render can hold its last frame past the estimated narration length, as a fraction of
+# that estimate. -shortest trims the excess, but the padding is still filtered, so it is bounded
+STREAM_HOLD_FACTOR = 1.0
+
+# How far (seconds) a streamed render may differ from the narration's real length before it is re-rendered
+STREAM_DURATION_TOLERANCE = 0.5
+
+
+def build_concat_list(frames, durations):
+    """Build an FFmpeg concat demuxer script showing each frame for its duration."""
+    def entry(frame):
+        # Absolute file: URLs, since relative entries would be resolved against the stdin pipe
+        path = os.path.abspath(frame).replace(os.sep, '/').replace("'", "'\\''")
+        return f"file 'file:{path}'"
+
+    lines = []
+    for frame, duration in zip(frames, durations):
+        lines.append(entry(frame))
+        lines.append(f"duration {duration:.3f}")
+    # Add the last image again without a duration, otherwise FFmpeg ignores the final duration
+    lines.append(entry(frames[-1]))
+    return "\n".join(lines) + "\n"
+
+
+@traced('ffmpeg_slideshow')
+def render_slideshow(frames, audio_file, output_path=output_video_path, durations=None, preset=DEFAULT_PRESET,
+                     motion=False, transition=None, width=1280, height=720):
+    """
+    Render an ordered list of frames as a slideshow over an audio track in a single FFmpeg pass.
+
+    The audio length is probed and, unless explicit per-frame durations are given,
+    spread evenly over the frames so the video always ends with the narration.
+    With motion (Ken Burns pan/zoom) or a transition (an xfade name such as
+    'fade'), frames are pre-scaled once to width x height and animated by
+    render_engine; otherwise they are concatenated as static stills. Either
+    way the frames are first normalized to one even size by image_prep.
+    preset names a render_engine.RENDER_PRESETS entry.
+    Returns the output path; raises RuntimeError if FFmpeg fails.
+    """
+    if not frames:
+        raise ValueError("At least one frame is required to render a slideshow.")
+    for path in [*frames, audio_file]:
+        if not os.path.exists(path):
+            raise FileNotFoundError(f"Input file '{path}' not found.")
+
+    animated = bool(motion or transition)
+    with prepare_frames(frames, *frame_size(width, height, motion), fit='cover' if animated else 'contain') as frames:
+        if None in frames:
+            raise RuntimeError(f"{frames.count(None)} of {len(frames)} frames could not be prepared.")
+
+        audio_duration = probe_duration(audio_file)
+        if durations is None:
+            durations = [audio_duration / len(frames)] * len(frames)
+        elif len(durations) != len(frames):
+            raise ValueError("Expected one duration per frame.")
+
+        output_dir = os.path.dirname(output_path)
+        if output_dir:
+            os.makedirs(output_dir, exist_ok=True)
+
+        if animated:
+            # One input per frame; the filter graph scales each image once and animates it
+            fps = get_preset(preset)['fps']
+            inputs = [arg for frame in frames for arg in ('-i', frame)]
+            command = [
+                'ffmpeg',
+                '-y',
+                *inputs,
+                '-i', audio_file,
+                '-filter_complex', slideshow_filter(durations, width, height, fps, motion, transition),
+                '-map', '[v]',
+                '-map', f'{len(frames)}:a',
+                *encoder_args(preset),
+                '-c:a', 'copy',
+                '-t', f"{audio_duration:.3f}",
+                output_path
+            ]
+            concat_list = None
+        else:
+            # Construct the FFmpeg command; the concat list is fed over stdin
+            command = [
+                'ffmpeg',
+                '-y',
+                '-f', 'concat',
+                '-safe', '0',
+                '-protocol_whitelist', 'file,pipe',
+                '-i', 'pipe:0',
+                '-i', audio_file,
+                *encoder_args(preset, tune='stillimage'),
+                '-c:a', 'copy',  # Copy the audio without re-encoding
+                '-t', f"{audio_duration:.3f}",  # Match the video duration to the audio
+                output_path
+            ]
+            concat_list = build_concat_list(frames, durations)
+
+        print(f"Running FFmpeg command: {' '.join(command)}")
+        result = subprocess.run(command, input=concat_list, capture_output=True, text=True)
+
+        if result.returncode != 0:
+            raise RuntimeError(f"FFmpeg failed with exit code {result.returncode}:\n{result.stderr}")
+        current_span().add_bytes(os.path.getsize(output_path))
+        print(f"Slideshow video with audio created successfully at {output_path}")
+        return output_path
+
+
+@traced('ffmpeg_slideshow_formats')
+def render_slideshow_formats(frames, audio_file, output_path=output_video_path, formats=tuple(OUTPUT_FORMATS),
+                             durations=None, preset=DEFAULT_PRESET, motion=False, transition=None):
+    """
+    Render the same slideshow in several output formats (see render_engine.OUTPUT_FORMATS)
+    with one FFmpeg invocation.
+
+    Every frame is decoded once and split per format, each branch being
+    cropped and scaled to its size a single time, and all variants share one
+    audio demux. Variants are written next to output_path as
+    <name>_<format>.mp4. Returns a dict of format name to path; raises
+    RuntimeError if FFmpeg fails.
+    """
+    if not frames:
+        raise ValueError("At least one frame is required to render a slideshow.")
+    if not formats:
+        raise ValueError("At least one output format is required.")
+    for path in [*frames, audio_file]:
+        if not os.path.exists(path):
+            raise FileNotFoundError(f"Input file '{path}' not found.")
+
+    # Frames keep their aspect ratio here, so each format can crop what it needs from the whole image
+    largest = max(max(frame_size(*get_format(name), motion)) for name in formats)
+    with prepare_frames(frames, largest, largest, fit='within') as frames:
+        if None in frames:
+            raise RuntimeError(f"{frames.count(None)} of {len(frames)} frames could not be prepared.")
+
+        audio_duration = probe_duration(audio_file)
+        if durations is None:
+            durations = [audio_duration / len(frames)] * len(frames)
+        elif len(durations) != len(frames):
+            raise ValueError("Expected one duration per frame.")
+
+        output_dir = os.path.dirname(output_path)
+        if output_dir:
+            os.makedirs(output_dir, exist_ok=True)
+
+        fps = get_preset(preset)['fps']
+        outputs = {name: variant_path(output_path, name) for name in formats}
+        command = [
+            'ffmpeg',
+            '-y',
+            *[arg for frame in frames for arg in ('-i', frame)],
+            '-i', audio_file,
+            '-filter_complex', formats_filter(durations, formats, fps, motion, transition),
+        ]
+        for j, name in enumerate(formats):
+            # Each output gets its own encoder; the audio is copied into all of them
+            command += [
+                '-map', f'[o{j}]',
+                '-map', f'{len(frames)}:a',
+                *encoder_args(preset, tune=None if motion or transition else 'stillimage'),
+                '-c:a', 'copy',
+                '-t', f"{audio_duration:.3f}",
+                outputs[name]
+            ]
+
+        print(f"Running FFmpeg command: {' '.join(command)}")
+        result = subprocess.run(command, capture_output=True, text=True)
+
+        if result.returncode != 0:
+            for path in outputs.values():
+                if os.path.exists(path):
+                    os.remove(path)
+            raise RuntimeError(f"FFmpeg failed with exit code {result.returncode}:\n{result.stderr}")
+        current_span().add_bytes(sum(os.path.getsize(path) for path in outputs.values()))
+        print(f"Slideshow videos in {len(outputs)} formats created successfully: {', '.join(outputs.values())}")
+        return outputs
+
+
+@traced('ffmpeg_slideshow_stream')
+def render_slideshow_streaming(frames, audio_chunks, output_path=output_video_path, estimated_duration=None,
+                               width=1280, height=720, preset=DEFAULT_PRESET, motion=False, transition=None):
+    """
+    Render a slideshow while the narration is still arriving.
+
+    audio_chunks is an iterable of MP3 bytes (e.g. content.stream_narration) that
+    is piped into FFmpeg's stdin, so encoding starts with the first bytes of
+    audio. The audio length isn't known up front, so the frames share
+    estimated_duration and the last frame is held until the audio ends.
+    Frames go through the same render_engine graph as render_slideshow,
+    including motion and transition.
+
+    The narration is kept on the side and probed afterwards. If the estimate
+    was so far off that the video was cut short, or the last frame barely
+    appears, the slideshow is rendered again from the full narration with
+    render_slideshow. Returns the output path; raises RuntimeError if FFmpeg
+    fails.
+    """
+    if not frames:
+        raise ValueError("At least one frame is required to render a slideshow.")
+    for path in frames:
+        if not os.path.exists(path):
+            raise FileNotFoundError(f"Input file '{path}' not found.")
+    animated = bool(motion or transition)
+    sources = frames
+    with prepare_frames(frames, *frame_size(width, height, motion), fit='cover' if animated else 'contain') as frames:
+        if None in frames:
+            raise RuntimeError(f"{frames.count(None)} of {len(frames)} frames could not be prepared.")
+
+        output_dir = os.path.dirname(output_path)
+        if output_dir:
+            os.makedirs(output_dir, exist_ok=True)
+        # Copy of the streamed narration, to check the render against its real length
+        audio_copy = f"{os.path.splitext(output_path)[0]}.stream.mp3"
+
+        estimated_duration = estimated_duration or 4.5 * len(frames)
+        duration = estimated_duration / len(frames)
+        fps = get_preset(preset)['fps']
+        # The last frame is cloned until -shortest cuts the video at the end of the audio
+        graph = slideshow_filter([duration] * len(frames), width, height, fps, motion, transition, label='s')
+        graph += f";[s]tpad=stop_mode=clone:stop_duration={estimated_duration * STREAM_HOLD_FACTOR:.3f}[v]"
+
+        command = [
+            'ffmpeg',
+            '-y',
+            *[arg for frame in frames for arg in ('-i', frame)],
+            '-f', 'mp3', '-i', 'pipe:0',  # Narration arrives on stdin
+            '-filter_complex', graph,
+            '-map', '[v]',
+            '-map', f'{len(frames)}:a',
+            *encoder_args(preset, tune=None if animated else 'stillimage'),
+            '-c:a', 'copy',
+            '-shortest',
+            output_path
+        ]
+
+        print(f"Running FFmpeg command: {' '.join(command)}")
+        process = subprocess.Popen(command, stdin=subprocess.PIPE, stdout=subprocess.DEVNULL, stderr=subprocess.PIPE)
+
+        feed_error = []
+
+        def feed_audio():
+            feeding = True
+            try:
+                with open(audio_copy, 'wb') as copy:
+                    for piece in audio_chunks:
+                        copy.write(piece)
+                        if not feeding:
+                            continue
+                        try:
+                            process.stdin.write(piece)
+                        except BrokenPipeError:
+                            # FFmpeg stopped reading. After a clean exit (the video hit its cap) keep the rest of
+                            # the narration for the length check; after a failure its stderr explains why
+                            feeding = False
+                            if process.wait() != 0:
+                                break
+            except Exception as e:
+                feed_error.append(e)
+            finally:
+                # Stop the producer too if FFmpeg went away before the narration ended
+                if hasattr(audio_chunks, 'close'):
+                    audio_chunks.close()
+                try:
+                    process.stdin.close()
+                except BrokenPipeError:
+                    pass
+
+        feeder = threading.Thread(target=feed_audio, daemon=True)
+        feeder.start()
+        stderr = process.stderr.read().decode('utf-8', errors='replace')
+        returncode = process.wait()
+        feeder.join()
+
+        try:
+            if feed_error:
+                if os.path.exists(output_path):
+                    os.remove(output_path)
+                raise RuntimeError(f"Narration stream failed: {feed_error[0]}")
+            if returncode != 0:
+                raise RuntimeError(f"FFmpeg failed with exit code {returncode}:\n{stderr}")
+
+            audio_duration = probe_duration(audio_copy)
+            rendered = probe_duration(output_path)
+            # A frame starts every `duration` seconds; narration ending early can leave the last ones unseen
+            if (abs(rendered - audio_duration) > STREAM_DURATION_TOLERANCE
+                    or audio_duration < duration * (len(frames) - 0.5)):
+                print(f"Streamed render is {rendered:.2f}s for {audio_duration:.2f}s of narration "
+                      f"(estimated {estimated_duration:.2f}s), rendering again from the full narration.")
+                render_slideshow(sources, audio_copy, output_path, preset=preset, motion=motion,
+                                 transition=transition, width=width, height=height)
+        finally:
+            if os.path.exists(audio_copy):
+                os.remove(audio_copy)
+        current_span().add_bytes(os.path.getsize(output_path))
+        print(f"Slideshow video with streamed audio created successfully at {output_path}")
+        return output_path
+
+
+if __name__ == "__main__":
+    # The storyline manifest written by content.py lists the frames in order along with the narration
+    if not os.path.exists(manifest_file):
+        raise FileNotFoundError(f"Storyline manifest '{manifest_file}' not found. Run content.py first.")
+    with open(manifest_file, 'r', encoding='utf-8') as f:
+        storyline = json.load(f)
+
+    try:
+        render_slideshow(storyline['frames'], storyline['narration'], output_video_path)
+    except RuntimeError as e:
+        print("FFmpeg Error:")
+        print(e)